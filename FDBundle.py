@@ -0,0 +1,185 @@
+import json
+import mmap
+import os
+import shutil
+import struct
+
+import FDTemplate
+
+# 模板包格式:
+#   文件头: 魔数(8 bytes) + 版本号(uint32) + 索引长度(uint32)，小端序
+#   索引: UTF-8 json，记录每个模板的名称、hash、关键词及内容在内容区中的偏移和长度
+#   内容区: 依次存放所有模板内容的UTF-8编码
+# 模板包通过内存映射读取，模板内容直接从映射区解码，不需要额外复制
+
+# 模板包文件拓展名
+bundle_extension = ".fdb"
+
+# 文件头
+bundle_magic = b"FDBUNDLE"
+bundle_version = 1
+header_format = "<8sII"
+header_size = struct.calcsize(header_format)
+
+# 已打开的模板包: 文件路径 -> (修改时间, 模板包)
+_opened = {}
+
+
+class Bundle:
+
+    def __init__(self, path: str):
+        self.path = path
+
+        with open(path, 'rb') as f:
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise FDTemplate.TemplateError("模板包文件内容为空")
+        self.view = memoryview(self.map)
+
+        try:
+            magic, version, index_size = struct.unpack_from(header_format, self.map)
+        except struct.error:
+            self.close()
+            raise FDTemplate.TemplateError("模板包文件头不合法")
+        if not magic == bundle_magic or not version == bundle_version:
+            self.close()
+            raise FDTemplate.TemplateError("不支持的模板包格式或版本")
+
+        try:
+            index = json.loads(str(self.view[header_size:header_size + index_size], 'utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            self.close()
+            raise FDTemplate.TemplateError("模板包索引已损坏")
+
+        # 模板索引
+        self.templates = index.get('templates', []) if isinstance(index, dict) else None
+        # 内容区起始位置
+        self.base = header_size + index_size
+
+        # 打开时校验所有索引条目，已损坏的模板包作为载入错误而不是在读取模板时出错
+        try:
+            if not isinstance(self.templates, list):
+                raise FDTemplate.TemplateError("模板包索引已损坏")
+            for item in self.templates:
+                checkItem(item, len(self.map) - self.base)
+        except FDTemplate.TemplateError:
+            self.close()
+            raise
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+    def hash(self, index: int) -> str:
+        return self.templates[index].get('hash')
+
+    def metadata(self, index: int) -> dict:
+        # 模板的元数据，不包括模板内容
+        item = self.templates[index]
+        data = dict(item.get('data', {}))
+        data['name'] = item.get('name')
+        data['rolename'] = item.get('rolename')
+        data['roledes'] = item.get('roledes')
+        return data
+
+    def content(self, index: int) -> str:
+        # 从映射区直接解码模板内容
+        item = self.templates[index]
+        start = self.base + item.get('offset')
+        end = start + item.get('length')
+        if end > len(self.map):
+            raise FDTemplate.TemplateError("模板包内容已损坏")
+        return str(self.view[start:end], 'utf-8')
+
+    def template(self, index: int) -> dict:
+        data = self.metadata(index)
+        data['content'] = self.content(index)
+        return data
+
+    def close(self) -> None:
+        self.view.release()
+        self.map.close()
+
+
+def checkItem(item, content_size: int) -> None:
+    # 校验一个索引条目: 名称和hash为字符串，关键词和描述为字符串列表，内容位置不超出内容区
+    if not isinstance(item, dict):
+        raise FDTemplate.TemplateError("模板包索引条目不合法")
+    if not isinstance(item.get('name'), str) or not isinstance(item.get('hash'), str):
+        raise FDTemplate.TemplateError("模板包索引条目缺少名称或hash")
+    for key in ['rolename', 'roledes']:
+        if not isinstance(item.get(key), list) or not all(isinstance(value, str) for value in item.get(key)):
+            raise FDTemplate.TemplateError("模板包中的模板{0}的{1}不合法".format(item.get('name'), key))
+    if not isinstance(item.get('data', {}), dict):
+        raise FDTemplate.TemplateError("模板包中的模板{0}的附加数据不合法".format(item.get('name')))
+    offset = item.get('offset')
+    length = item.get('length')
+    if type(offset) is not int or type(length) is not int or offset < 0 or length < 0 \
+            or offset + length > content_size:
+        raise FDTemplate.TemplateError("模板包中的模板{0}的内容位置不合法".format(item.get('name')))
+
+
+def isBundle(path: str) -> bool:
+    return path.lower().endswith(bundle_extension)
+
+
+def openBundle(path: str) -> Bundle:
+    # 打开模板包，文件未改动时复用已打开的模板包
+    mtime = os.stat(path).st_mtime_ns
+    opened = _opened.get(path)
+    if opened is not None and opened[0] == mtime:
+        return opened[1]
+    bundle = Bundle(path)
+    _opened[path] = (mtime, bundle)
+    return bundle
+
+
+def readContent(path: str, index: int) -> str:
+    return openBundle(path).content(index)
+
+
+def writeBundle(path: str, templates) -> int:
+    # 将 (hash, 模板字典) 写入模板包，返回写入的模板数量
+
+    index = []
+    offset = 0
+
+    # 先将模板内容写入临时文件，再写入文件头和索引，避免在内存中保存所有模板内容
+    # 写入中断或模板有误时删除所有临时文件，已有的同名模板包保持不变
+    try:
+        with open(path + ".blobs", 'wb') as blobs:
+            for hash_value, data in templates:
+                content = data.get('content').encode('utf-8')
+                blobs.write(content)
+                extra = dict((key, value) for key, value in data.items()
+                             if key not in ['name', 'content', 'rolename', 'roledes', 'hash', 'path', 'bundle_index'])
+                item = {'name': data.get('name'),
+                        'hash': hash_value,
+                        'rolename': data.get('rolename'),
+                        'roledes': data.get('roledes'),
+                        'offset': offset,
+                        'length': len(content)}
+                if extra:
+                    item['data'] = extra
+                index.append(item)
+                offset += len(content)
+
+        index_data = json.dumps({'templates': index}, ensure_ascii=False).encode('utf-8')
+
+        with open(path + ".part", 'wb') as f:
+            f.write(struct.pack(header_format, bundle_magic, bundle_version, len(index_data)))
+            f.write(index_data)
+            with open(path + ".blobs", 'rb') as blobs:
+                shutil.copyfileobj(blobs, f)
+
+        # 替换前关闭已打开的同名模板包，否则在Windows上无法替换被映射的文件
+        opened = _opened.pop(path, None)
+        if opened is not None:
+            opened[1].close()
+        os.replace(path + ".part", path)
+    finally:
+        for temp_path in [path + ".blobs", path + ".part"]:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return len(index)
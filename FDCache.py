@@ -0,0 +1,148 @@
+import sys
+from collections import OrderedDict
+
+import global_var
+
+global renderCache
+global templateCache
+
+# 默认最多缓存的生成结果数量
+default_size = 128
+# 默认缓存占用的内存上限(MB)
+default_memory = 32
+# 懒加载模式下默认保留在内存中的模板数量
+default_hot_size = 16
+
+
+class RenderCache:
+    # 生成结果的LRU缓存，以 (模板hash, 替换内容) 为键
+
+    def __init__(self):
+        # 缓存的生成结果，最近使用的在末尾
+        self.entries = OrderedDict()
+        # 当前缓存占用的内存(bytes)
+        self.memory = 0
+        # 命中次数
+        self.hits = 0
+        # 未命中次数
+        self.misses = 0
+
+    @staticmethod
+    def makeKey(template_hash: str, replacements: dict) -> tuple:
+        # 规范化替换内容: 与顺序无关，空关键词不参与替换
+        return template_hash, tuple(sorted((key, value) for key, value in replacements.items() if key != ""))
+
+    @staticmethod
+    def limits() -> (int, int):
+        # 读取配置项中的缓存大小和内存上限
+        size = global_var.get_config('render_cache_size')
+        memory = global_var.get_config('render_cache_memory')
+        if not isinstance(size, int) or size < 0:
+            size = default_size
+        if not isinstance(memory, (int, float)) or memory < 0:
+            memory = default_memory
+        return size, int(memory * 1000000)
+
+    def get(self, template_hash: str, replacements: dict):
+        key = self.makeKey(template_hash, replacements)
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, template_hash: str, replacements: dict, result: str) -> None:
+        size, memory = self.limits()
+        result_memory = sys.getsizeof(result)
+
+        # 超过内存上限的结果不缓存
+        if size == 0 or result_memory > memory:
+            return
+
+        key = self.makeKey(template_hash, replacements)
+        if key in self.entries:
+            self.memory -= sys.getsizeof(self.entries.pop(key))
+        self.entries[key] = result
+        self.memory += result_memory
+
+        # 淘汰最久未使用的结果
+        while len(self.entries) > size or self.memory > memory:
+            old_key, old_result = self.entries.popitem(last=False)
+            self.memory -= sys.getsizeof(old_result)
+
+    def invalidate(self, template_hash: str) -> None:
+        # 模板重新载入或改动后移除该模板的所有缓存
+        for key in [key for key in self.entries.keys() if key[0] == template_hash]:
+            self.memory -= sys.getsizeof(self.entries.pop(key))
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.memory = 0
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        return "生成缓存: 命中 {} / 未命中 {} (命中率 {:.1%}), 已缓存 {} 条, 占用 {:.2f} MB".format(
+            self.hits,
+            self.misses,
+            self.hits / total if total else 0,
+            len(self.entries),
+            self.memory / 1000000)
+
+
+class TemplateCache:
+    # 懒加载模式下最近使用的预编译模板，以模板hash为键
+
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def get(self, template_hash: str):
+        compiled = self.entries.get(template_hash)
+        if compiled is not None:
+            self.entries.move_to_end(template_hash)
+        return compiled
+
+    def put(self, template_hash: str, compiled) -> None:
+        size = global_var.get_config('lazy_cache_size')
+        if not isinstance(size, int) or size < 1:
+            size = default_hot_size
+        self.entries[template_hash] = compiled
+        self.entries.move_to_end(template_hash)
+        while len(self.entries) > size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, template_hash: str) -> None:
+        self.entries.pop(template_hash, None)
+
+
+def init():
+    global renderCache
+    renderCache = RenderCache()
+    global templateCache
+    templateCache = TemplateCache()
+
+
+def get(template_hash: str, replacements: dict):
+    return renderCache.get(template_hash, replacements)
+
+
+def put(template_hash: str, replacements: dict, result: str) -> None:
+    renderCache.put(template_hash, replacements, result)
+
+
+def invalidate(template_hash: str) -> None:
+    renderCache.invalidate(template_hash)
+    templateCache.invalidate(template_hash)
+
+
+def get_template(template_hash: str):
+    return templateCache.get(template_hash)
+
+
+def put_template(template_hash: str, compiled) -> None:
+    templateCache.put(template_hash, compiled)
+
+
+def stats() -> str:
+    return renderCache.stats()
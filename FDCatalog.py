@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+
+import FDTemplate
+
+# 模板目录缓存文件，记录每个模板文件的大小、修改时间、hash和解析结果
+catalog_path = "FDCatalog.json"
+
+# 懒加载模式的模板目录缓存文件，不记录模板内容
+lazy_catalog_path = "FDCatalog_lazy.json"
+
+# 上次载入完成时的载入模式，配置文件随模板一同载入，启动时据此在载入模板前决定是否懒加载
+mode_path = "FDCatalog_mode.json"
+
+# 模板目录缓存格式版本，格式改变时旧的缓存将被丢弃
+catalog_version = 1
+
+
+class Catalog:
+    # 持久化的模板目录，大小和修改时间均未改变的文件直接使用缓存的解析结果，无需重新读取和计算hash
+
+    def __init__(self, path: str = None, lazy: bool = False):
+        if path is None:
+            path = lazy_catalog_path if lazy else catalog_path
+        self.path = path
+        # 懒加载模式: 只记录模板的元数据，不保留模板内容
+        self.lazy = lazy
+        # 文件路径 -> 缓存条目
+        self.entries = {}
+        # 本次载入中出现过的文件
+        self.seen = set()
+        # 是否需要写回
+        self.dirty = False
+        # 后台并行载入时保护以上状态
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                catalog = json.load(f)
+            if catalog.get('version') == catalog_version:
+                self.entries = catalog.get('entries', {})
+            # 懒加载模式下不在内存中保留模板内容
+            if self.lazy:
+                for entry in self.entries.values():
+                    if isinstance(entry.get('data'), dict):
+                        entry['data'].pop('content', None)
+        except (OSError, ValueError, AttributeError):
+            # 缓存不存在或已损坏时重新建立
+            self.dirty = True
+
+    def loadFile(self, path: str) -> dict:
+        # 载入模板文件，返回包含 hash 和 data 的条目，文件已损坏时条目包含 error
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return {'error': "模板文件无法读取"}
+
+        with self.lock:
+            self.seen.add(path)
+            entry = self.entries.get(path)
+        if entry is not None and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns:
+            return entry
+
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        try:
+            entry['hash'], entry['data'] = FDTemplate.readTemplate(path)
+            if not FDTemplate.isConfig(entry['data']):
+                FDTemplate.checkTemplate(entry['data'])
+                if self.lazy:
+                    entry['data'].pop('content')
+        except FDTemplate.TemplateError as e:
+            entry.pop('data', None)
+            entry['error'] = str(e)
+        except OSError:
+            return {'error': "模板文件无法读取"}
+
+        with self.lock:
+            self.entries[path] = entry
+            self.dirty = True
+        return entry
+
+    def isChanged(self, path: str) -> bool:
+        # 检测模板文件是否为新文件或在上次载入后被改动
+        entry = self.entries.get(path)
+        if entry is None:
+            return True
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+        return not (entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime_ns)
+
+    def removeFile(self, path: str) -> None:
+        # 模板文件已被删除
+        with self.lock:
+            self.entries.pop(path, None)
+            self.seen.discard(path)
+            self.dirty = True
+
+    def save(self) -> None:
+        # 移除已不存在的文件并写回缓存
+
+        for path in [path for path in self.entries.keys() if path not in self.seen]:
+            del self.entries[path]
+            self.dirty = True
+
+        if not self.dirty:
+            return
+
+        # 先写入临时文件再替换，避免写入中断导致缓存损坏
+        try:
+            with open(self.path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump({'version': catalog_version, 'entries': self.entries}, f, ensure_ascii=False)
+            os.replace(self.path + ".tmp", self.path)
+        except OSError:
+            return
+        self.dirty = False
+
+
+def lastLazy() -> bool:
+    # 上次载入模板时是否使用懒加载模式
+    try:
+        with open(mode_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('lazy') is True
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+def saveLazy(lazy: bool) -> None:
+    # 记录本次载入模板后配置的懒加载模式，未改变时不写入
+    if lastLazy() == lazy:
+        return
+    try:
+        with open(mode_path, 'w', encoding='utf-8') as f:
+            json.dump({'lazy': lazy}, f)
+    except OSError:
+        return
@@ -0,0 +1,65 @@
+from PySide2.QtUiTools import QUiLoader
+from PySide2.QtWidgets import QComboBox, QDialog, QTableWidgetItem, QHeaderView
+
+import FDRescue
+import global_var
+
+# 同步模板时汇总所有同名模板，在一个表格中一次选择处理方式
+
+# 处理方式选项: (显示文本, 处理方式)
+actions = [("覆盖下载", 'overwrite'), ("重命名下载", 'rename'), ("不下载", 'skip')]
+
+
+class ConflictDialog:
+
+    def __init__(self, parent, conflicts: list):
+        # conflicts: [(模板名称, 云端大小, 本地模板位置)]
+        try:
+            self.ui = QUiLoader().load('ui\\FormConflicts.ui', parent)
+        except RuntimeError:
+            # 缺少必要文件，启用恢复模式
+            FDRescue.rescueMode()
+            self.ui = QUiLoader().load('ui\\FormConflicts.ui', parent)
+
+        # 设置窗口图标
+        self.ui.setWindowIcon(global_var.app_icon)
+        self.ui.labelConflicts.setText(
+            "以下{0}个云端模板与本地模板同名但内容不同，请选择处理方式".format(len(conflicts)))
+
+        # 每个同名模板一行，最后一列为处理方式选择框
+        table = self.ui.tableConflicts
+        table.setRowCount(len(conflicts))
+        self.combos = []
+        for row, (name, size, location) in enumerate(conflicts):
+            table.setItem(row, 0, QTableWidgetItem(name))
+            table.setItem(row, 1, QTableWidgetItem("{0} Bytes".format(size)))
+            table.setItem(row, 2, QTableWidgetItem(location))
+            combo = QComboBox()
+            for text, action in actions:
+                combo.addItem(text, action)
+            table.setCellWidget(row, 3, combo)
+            self.combos.append(combo)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        table.horizontalHeader().setStretchLastSection(True)
+
+        # 绑定按钮事件
+        self.ui.buttonAllOverwrite.clicked.connect(lambda: self.setAll('overwrite'))
+        self.ui.buttonAllRename.clicked.connect(lambda: self.setAll('rename'))
+        self.ui.buttonAllSkip.clicked.connect(lambda: self.setAll('skip'))
+        self.ui.buttonBox.accepted.connect(self.ui.accept)
+        self.ui.buttonBox.rejected.connect(self.ui.reject)
+
+    def setAll(self, action: str) -> None:
+        for combo in self.combos:
+            combo.setCurrentIndex(combo.findData(action))
+
+    def selected(self) -> list:
+        return [combo.currentData() for combo in self.combos]
+
+
+def review(parent, conflicts: list):
+    # 显示同名模板表格，返回每个模板的处理方式列表，取消时返回None
+    dialog = ConflictDialog(parent, conflicts)
+    if dialog.ui.exec_() != QDialog.Accepted:
+        return None
+    return dialog.selected()
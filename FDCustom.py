@@ -1,13 +1,17 @@
 import time
 import os
 import json
+import sqlite3
 
 from PySide2.QtWidgets import QMessageBox, QFileDialog
 from PySide2.QtUiTools import QUiLoader
 
 import FDRescue
+import FDStore
+import FDTemplate
 import global_var
 import FDDebug
+import FDMain
 
 global fdCustom
 
@@ -294,7 +298,6 @@ class FDCustom:
             self.ui.labelUnsaved.setVisible(False)
 
     def saveTemplate(self):
-        save_name = ""
 
         # 检测模板是否为空
         if self.content == "":
@@ -305,13 +308,27 @@ class FDCustom:
         if self.name == "":
             self.name = "未命名自定义模板" + time.strftime("_%Y_%m_%d_%H_%M_%S", time.localtime())
 
+        # 使用模板数据库时保存到数据库
+        try:
+            store = FDStore.openStore() if FDStore.isEnabled() else None
+        except FDTemplate.TemplateError as e:
+            QMessageBox.critical(self.ui, "保存失败", "模板保存失败: {0}".format(e), QMessageBox.Ok)
+            return
+
+        # 默认保存路径
+        save_name = "FDTemplates\\{0}.json".format(self.name)
+        name = self.name
+
         # 检测同名模板是否存在
-        if os.path.exists("FDTemplates\\{0}.json".format(self.name)):
+        if store.exists(name) if store is not None else os.path.exists(save_name):
             # 弹窗确认是否覆盖保存
             msgbox = QMessageBox()
             msgbox.setWindowTitle("同名模板已存在")
             msgbox.setText("你确定要覆盖当前模板吗？")
-            msgbox.setInformativeText("当前同名模板:{0}\\FDTemplates\\{1}.json".format(os.getcwd(), self.name))
+            if store is not None:
+                msgbox.setInformativeText("当前同名模板:{0}\\{1}#{2}".format(os.getcwd(), store.path, self.name))
+            else:
+                msgbox.setInformativeText("当前同名模板:{0}\\FDTemplates\\{1}.json".format(os.getcwd(), self.name))
             msgbox.setIcon(QMessageBox.Warning)
             msgbox.setStandardButtons(QMessageBox.Yes | QMessageBox.Ok | QMessageBox.No)
             msgbox.setDefaultButton(QMessageBox.Yes)
@@ -320,8 +337,8 @@ class FDCustom:
             msgbox.setButtonText(QMessageBox.No, "取消保存")
             ret = msgbox.exec_()
             if ret == QMessageBox.Ok:
-                save_name = "FDTemplates\\{0}_自定义于_{1}.json".format(self.name, time.strftime(
-                    "%Y_%m_%d_%H_%M_%S", time.localtime()))
+                name = "{0}_自定义于_{1}".format(self.name, time.strftime("%Y_%m_%d_%H_%M_%S", time.localtime()))
+                save_name = "FDTemplates\\{0}.json".format(name)
             elif ret == QMessageBox.Yes:
                 save_name = "FDTemplates\\{0}.json".format(self.name)
             else:
@@ -331,9 +348,21 @@ class FDCustom:
         json_dump = {'Name': self.name, 'Content': self.content, 'Rolename': self.keywords,
                      'RoleDes': self.descriptions}
 
-        # 保存json文件
-        with open(save_name, "w") as f:
-            json.dump(json_dump, f)
+        if store is not None:
+            # 在一个事务中保存到模板数据库，hash与保存为模板文件时相同
+            try:
+                store.saveTemplate({'name': name, 'content': self.content, 'rolename': self.keywords,
+                                    'roledes': self.descriptions},
+                                   FDTemplate.blobHash(json.dumps(dict(json_dump, Name=name)).encode('utf-8')))
+            except (FDTemplate.TemplateError, sqlite3.Error) as e:
+                QMessageBox.critical(self.ui, "保存失败", "模板保存失败: {0}".format(e), QMessageBox.Ok)
+                FDDebug.debug("模板保存失败: {0}".format(e), type='error', who=self.__class__.__name__)
+                return
+            save_name = "{0}#{1}".format(store.path, name)
+        else:
+            # 保存json文件
+            with open(save_name, "w") as f:
+                json.dump(json_dump, f)
 
         # 标记已经保存
         self.saved = True
@@ -346,6 +375,9 @@ class FDCustom:
         FDDebug.debug("模板文件已保存至{0}\\{1}".format(os.getcwd(), save_name),
                       type='success', who=self.__class__.__name__)
 
+        # 刷新模板列表，监视模式下只载入保存的模板文件
+        FDMain.loadTemplates()
+
     def closeEditor(self):
         # 弹窗确认是否关闭
         msgbox = QMessageBox()
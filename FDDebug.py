@@ -88,6 +88,10 @@ def split():
     fdDebug.debug("", split=True)
 
 
+def set_cache_stats(text: str) -> None:
+    fdDebug.ui.labelCache.setText(text)
+
+
 def display() -> None:
     debug("已打开调试输出界面", type='success', who='FDDebug')
     fdDebug.ui.show()
@@ -0,0 +1,150 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+import FDNetwork
+
+# 并行下载文件，所有下载共用一个保持连接的会话
+
+# 同时下载的最大数量
+max_workers = FDNetwork.pool_size
+# 流式下载时每次写入的大小
+chunk_size = 65536
+
+
+class DownloadError(Exception):
+    # 下载的文件与预期的大小或摘要不一致
+    pass
+
+
+class DownloadCancelled(Exception):
+    # 下载被取消，已下载的部分保留用于断点续传
+    pass
+
+
+def fetch(session: requests.Session, url: str) -> bytes:
+    r = FDNetwork.get(url, session=session)
+    r.raise_for_status()
+    return r.content
+
+
+def downloadAll(downloads, workers: int = max_workers, session: requests.Session = None):
+    # 并行下载 [(键, 地址)]，按完成顺序返回 (键, 内容, 错误)，下载失败时内容为None
+    # 默认使用共享会话，下载线程数超过共享连接池大小时建立连接池足够大的会话
+    # 提前结束迭代时取消尚未开始的下载
+    own_session = session is None and workers > FDNetwork.pool_size
+    if own_session:
+        session = FDNetwork.createSession(workers)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = dict((executor.submit(fetch, session, url), key) for key, url in downloads)
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except requests.exceptions.RequestException as e:
+                yield futures[future], None, str(e)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        if own_session:
+            session.close()
+
+
+def fileDigest(path: str, algorithm: str) -> str:
+    # 分块计算文件摘要，内存占用与文件大小无关
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verifyFile(path: str, size: int = None, digest: str = None) -> None:
+    # 校验文件大小和摘要，摘要格式为 "算法:十六进制值"(例如 "sha256:..."), 不一致时抛出 DownloadError
+    if size is not None and not os.path.getsize(path) == size:
+        raise DownloadError("文件大小不一致: 应为{0}字节，实际为{1}字节".format(size, os.path.getsize(path)))
+    if digest:
+        algorithm, _, expected = digest.partition(":")
+        try:
+            actual = fileDigest(path, algorithm)
+        except ValueError:
+            # 不支持的摘要算法只校验大小
+            return
+        if not actual == expected.lower():
+            raise DownloadError("文件{0}摘要不一致".format(algorithm))
+
+
+def discardPart(path: str) -> None:
+    # 删除未完成的下载
+    for temp_path in [path + ".part", path + ".etag"]:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def downloadFile(url: str, path: str, size: int = None, digest: str = None,
+                 session: requests.Session = None, progress=None) -> str:
+    # 流式下载文件到 path，边下载边写入 .part 文件，内存占用与文件大小无关
+    # 存在未完成的下载时以 Range 请求续传，文件在服务器上已改变时(ETag不同)重新下载
+    # 下载完成后校验大小和摘要，校验失败时删除已下载的文件并抛出 DownloadError
+    # progress(已下载字节数, 总字节数) 返回False时取消下载并抛出 DownloadCancelled，总字节数未知时为0
+    part_path = path + ".part"
+    etag_path = path + ".etag"
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    # 已下载的部分超出预期大小时从头下载
+    if size is not None and offset > size:
+        offset = 0
+
+    # 上次已下载完整但未完成校验时无需再次请求
+    if size is None or offset < size:
+        # 没有ETag时无法确认服务器上的文件未改变，从头下载
+        headers = {}
+        if offset > 0 and os.path.exists(etag_path):
+            with open(etag_path, 'r', encoding='utf-8') as f:
+                headers['Range'] = "bytes={0}-".format(offset)
+                headers['If-Range'] = f.read()
+
+        restart = False
+        with FDNetwork.get(url, headers=headers, stream=True, session=session) as r:
+
+            # 续传的起始位置超出服务器上的文件: 服务器上的文件大小与已下载的部分相同时已下载完整，否则从头下载
+            if r.status_code == 416 and 'Range' in headers:
+                if not r.headers.get('Content-Range') == "bytes */{0}".format(offset):
+                    discardPart(path)
+                    restart = True
+            else:
+                r.raise_for_status()
+
+                # 服务器不支持续传、文件已改变或返回的范围不符时从头下载
+                if r.status_code == 206 and r.headers.get('Content-Range', "").startswith("bytes {0}-".format(offset)):
+                    mode = 'ab'
+                else:
+                    mode = 'wb'
+                    offset = 0
+                if r.headers.get('ETag') is not None:
+                    with open(etag_path, 'w', encoding='utf-8') as f:
+                        f.write(r.headers.get('ETag'))
+
+                total = size or (int(r.headers.get('Content-Length')) + offset
+                                 if r.headers.get('Content-Length') else 0)
+                with open(part_path, mode) as f:
+                    for chunk in r.iter_content(chunk_size=chunk_size):
+                        f.write(chunk)
+                        offset += len(chunk)
+                        if progress is not None and progress(offset, total) is False:
+                            raise DownloadCancelled()
+
+        if restart:
+            return downloadFile(url, path, size, digest, session, progress)
+
+    try:
+        verifyFile(part_path, size, digest)
+    except DownloadError:
+        discardPart(path)
+        raise
+
+    os.replace(part_path, path)
+    if os.path.exists(etag_path):
+        os.remove(etag_path)
+    return path
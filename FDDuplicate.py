@@ -0,0 +1,155 @@
+global duplicateIndex
+
+# 内容切分为连续字符片段(shingle)的长度
+shingle_size = 4
+# MinHash 签名长度，必须是2的幂
+signature_size = 64
+# LSH 分段数量，每段 signature_size / band_count 个值
+band_count = 16
+# 判定为相似模板的最低相似度(估计的Jaccard系数)
+default_threshold = 0.8
+
+_mask = (1 << 64) - 1
+_empty = 1 << 64
+
+
+def normalize(content: str) -> str:
+    # 忽略空白字符和大小写的差异
+    return "".join(content.lower().split())
+
+
+def signature(content: str) -> tuple:
+    # 计算内容的 MinHash 签名(单次哈希分桶并填充空桶)，整个计算对内容长度线性
+    # 使用Python内置哈希，签名只在当前进程中有效，不能持久化
+    text = normalize(content)
+    if len(text) < shingle_size:
+        shingles = {text}
+    else:
+        shingles = set(text[index:index + shingle_size] for index in range(len(text) - shingle_size + 1))
+
+    # 每个片段只计算一次哈希，低位决定所在的桶，高位参与比较
+    mins = [_empty] * signature_size
+    bits = signature_size.bit_length() - 1
+    for value in map(hash, shingles):
+        value &= _mask
+        slot = value & (signature_size - 1)
+        value >>= bits
+        if value < mins[slot]:
+            mins[slot] = value
+
+    # 空桶使用右侧第一个非空桶的值填充，使签名的每一位都可比较
+    for slot in range(signature_size):
+        if mins[slot] == _empty:
+            for offset in range(1, signature_size):
+                value = mins[(slot + offset) % signature_size]
+                if value != _empty:
+                    mins[slot] = value + offset * _empty
+                    break
+
+    return tuple(mins)
+
+
+def similarity(a: tuple, b: tuple) -> float:
+    # 由签名估计的Jaccard相似度
+    return sum(1 for x, y in zip(a, b) if x == y) / signature_size
+
+
+class DuplicateIndex:
+    # 相似模板的 LSH 索引，签名分段后相同的模板进入同一个桶，只比较同桶的模板
+
+    def __init__(self):
+        # 模板hash -> (模板名称, 签名)
+        self.signatures = {}
+        # (分段序号, 分段值) -> 模板hash集合
+        self.buckets = {}
+
+    def bands(self, sig: tuple):
+        rows = signature_size // band_count
+        for band in range(band_count):
+            yield band, sig[band * rows:(band + 1) * rows]
+
+    def add(self, template_hash: str, name: str, content: str, sig: tuple = None) -> None:
+        if template_hash in self.signatures:
+            self.remove(template_hash)
+        if sig is None:
+            sig = signature(content)
+        self.signatures[template_hash] = (name, sig)
+        for key in self.bands(sig):
+            self.buckets.setdefault(key, set()).add(template_hash)
+
+    def remove(self, template_hash: str) -> None:
+        entry = self.signatures.pop(template_hash, None)
+        if entry is None:
+            return
+        for key in self.bands(entry[1]):
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                continue
+            bucket.discard(template_hash)
+            if len(bucket) == 0:
+                del self.buckets[key]
+
+    def clear(self) -> None:
+        self.signatures.clear()
+        self.buckets.clear()
+
+    def groups(self, threshold: float = default_threshold) -> list:
+        # 返回相似模板分组: [[(模板hash, 模板名称), ...]]，每组至少两个模板
+
+        # 并查集
+        parent = {}
+
+        def find(item):
+            root = item
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while parent.get(item, item) != root:
+                parent[item], item = root, parent[item]
+            return root
+
+        # 同一个桶中的模板两两比较，已在同一组中的模板无需再比较，多个桶共有的模板对只比较一次
+        compared = set()
+        for bucket in self.buckets.values():
+            if len(bucket) < 2:
+                continue
+            members = sorted(bucket)
+            for index, member_a in enumerate(members):
+                sig_a = self.signatures[member_a][1]
+                for member_b in members[index + 1:]:
+                    root_a, root_b = find(member_a), find(member_b)
+                    if root_a == root_b or (member_a, member_b) in compared:
+                        continue
+                    compared.add((member_a, member_b))
+                    if similarity(sig_a, self.signatures[member_b][1]) >= threshold:
+                        parent[root_b] = root_a
+
+        grouped = {}
+        for template_hash in parent.keys():
+            grouped.setdefault(find(template_hash), set()).add(template_hash)
+        for root in list(grouped.keys()):
+            grouped[root].add(root)
+
+        return [sorted(((template_hash, self.signatures[template_hash][0]) for template_hash in members),
+                       key=lambda item: item[1])
+                for members in grouped.values() if len(members) > 1]
+
+
+def init():
+    global duplicateIndex
+    duplicateIndex = DuplicateIndex()
+
+
+def add(template_hash: str, name: str, content: str, sig: tuple = None) -> None:
+    duplicateIndex.add(template_hash, name, content, sig)
+
+
+def remove(template_hash: str) -> None:
+    duplicateIndex.remove(template_hash)
+
+
+def clear() -> None:
+    duplicateIndex.clear()
+
+
+def groups(threshold: float = default_threshold) -> list:
+    return duplicateIndex.groups(threshold)
@@ -0,0 +1,78 @@
+import os
+
+import global_var
+
+# 网络端点: 所有云端地址由此生成，可以通过配置项指向内部镜像或本地替身服务器(mirror.py)
+#   配置项 mirror_url: 镜像根地址，各端点分别位于 镜像根地址/api, /raw, /codeload, /download
+#   配置项 endpoints: {端点名称: 地址}，单独指定某个端点，优先于 mirror_url
+#   环境变量 FD_MIRROR_URL: 与 mirror_url 相同，用于尚未载入配置文件时(恢复模式)和命令行工具
+
+# 模板仓库
+repo = "Pitrick3141/DontFDHere"
+branch = "master"
+
+# 默认端点
+default_endpoints = {'api': "https://api.github.com",
+                     'raw': "https://raw.githubusercontent.com",
+                     'codeload': "https://codeload.github.com",
+                     'download': "https://github.com"}
+
+# 镜像根地址环境变量
+mirror_env = "FD_MIRROR_URL"
+
+
+def mirrorUrl():
+    # 镜像根地址，未配置时返回None
+    mirror = global_var.get_config('mirror_url')
+    if not isinstance(mirror, str) or mirror == "":
+        mirror = os.environ.get(mirror_env)
+    return mirror.rstrip("/") if mirror else None
+
+
+def endpoint(name: str) -> str:
+    endpoints = global_var.get_config('endpoints')
+    if isinstance(endpoints, dict) and isinstance(endpoints.get(name), str) and not endpoints.get(name) == "":
+        return endpoints.get(name).rstrip("/")
+    mirror = mirrorUrl()
+    if mirror is not None:
+        return "{0}/{1}".format(mirror, name)
+    return default_endpoints[name]
+
+
+def apiUrl(path: str) -> str:
+    return "{0}/repos/{1}/{2}".format(endpoint('api'), repo, path)
+
+
+def contentsUrl(path: str) -> str:
+    # 仓库目录列表
+    return apiUrl("contents/" + path)
+
+
+def treeUrl() -> str:
+    # 仓库完整文件树
+    return apiUrl("git/trees/" + branch)
+
+
+def commitsUrl() -> str:
+    # 提交历史，可按文件路径筛选
+    return apiUrl("commits")
+
+
+def releaseUrl() -> str:
+    # 最新版本信息
+    return apiUrl("releases/latest")
+
+
+def rawUrl(path: str) -> str:
+    # 仓库文件内容
+    return "{0}/{1}/{2}/{3}".format(endpoint('raw'), repo, branch, path)
+
+
+def archiveUrl() -> str:
+    # 仓库压缩包
+    return "{0}/{1}/zip/refs/heads/{2}".format(endpoint('codeload'), repo, branch)
+
+
+def assetUrl(tag: str, name: str) -> str:
+    # 发布文件
+    return "{0}/{1}/releases/download/{2}/{3}".format(endpoint('download'), repo, tag, name)
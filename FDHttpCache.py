@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+import FDNetwork
+import global_var
+
+# GitHub API响应的磁盘缓存，以ETag和Last-Modified发送条件请求
+# 未认证的GitHub API每小时只允许60次请求，返回304的条件请求不计入限制
+
+# 缓存目录，每个请求对应一个元数据文件(.json)和一个响应内容文件(.body)
+cache_dir = "FDHttpCache"
+
+# 默认缓存有效期(秒)，有效期内直接使用缓存，不发送请求
+default_ttl = 300
+
+# 需要缓存的响应头
+cached_headers = ['ETag', 'Last-Modified', 'Content-Type']
+
+
+class CachedResponse:
+    # 与 requests.Response 用法相同的响应
+
+    def __init__(self, url: str, status_code: int, content: bytes, headers: dict,
+                 from_cache: bool = False, stale: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        # 响应来自缓存
+        self.from_cache = from_cache
+        # 缓存已过期但无法连接网络或处于离线模式
+        self.stale = stale
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+
+def settings() -> (float, bool):
+    # 读取配置项中的缓存有效期和离线模式
+    ttl = global_var.get_config('http_cache_ttl')
+    if not isinstance(ttl, (int, float)) or ttl < 0:
+        ttl = default_ttl
+    return ttl, global_var.get_config('offline_mode') is True
+
+
+def cacheKey(url: str, params: dict = None) -> str:
+    return hashlib.sha1(json.dumps([url, sorted((params or {}).items())]).encode('utf-8')).hexdigest()
+
+
+def loadEntry(key: str):
+    # 读取缓存，返回 (元数据, 响应内容)，缓存不存在或已损坏时返回None
+    path = os.path.join(cache_dir, key)
+    try:
+        with open(path + ".json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(path + ".body", 'rb') as f:
+            content = f.read()
+    except (OSError, ValueError):
+        return None
+    if not len(content) == meta.get('length'):
+        return None
+    return meta, content
+
+
+def saveEntry(key: str, meta: dict, content: bytes = None) -> None:
+    # 先写入临时文件再替换，响应内容先于元数据写入，content 为None时只更新元数据
+    path = os.path.join(cache_dir, key)
+    try:
+        if not os.path.exists(cache_dir):
+            os.mkdir(cache_dir)
+        if content is not None:
+            with open(path + ".body.part", 'wb') as f:
+                f.write(content)
+            os.replace(path + ".body.part", path + ".body")
+        with open(path + ".json.part", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(path + ".json.part", path + ".json")
+    except OSError:
+        return
+
+
+def fromEntry(entry, stale: bool = False) -> CachedResponse:
+    meta, content = entry
+    return CachedResponse(meta.get('url'), meta.get('status'), content, meta.get('headers', {}),
+                          from_cache=True, stale=stale)
+
+
+def get(url: str, params: dict = None, session: requests.Session = None, ttl: float = None) -> CachedResponse:
+    # 发送带缓存的GET请求，ttl 不为空时代替配置项中的缓存有效期
+    # 有效期内的缓存直接返回; 过期的缓存发送条件请求，返回304时继续使用缓存
+    # 无法连接网络、请求失败或处于离线模式时使用过期的缓存，没有缓存时抛出 requests 的异常
+    # 请求次数即将用完时推迟请求，有缓存时先使用过期的缓存
+    config_ttl, offline = settings()
+    if ttl is None:
+        ttl = config_ttl
+    key = cacheKey(url, params)
+    entry = loadEntry(key)
+
+    if offline:
+        if entry is None:
+            raise requests.exceptions.ConnectionError("离线模式下没有可用的缓存: {0}".format(url))
+        return fromEntry(entry, stale=True)
+
+    if entry is not None and time.time() - entry[0].get('fetched', 0) < ttl:
+        return fromEntry(entry)
+
+    if entry is not None and FDNetwork.waitTime(url) > 0:
+        return fromEntry(entry, stale=True)
+
+    headers = {}
+    if entry is not None:
+        if entry[0].get('headers', {}).get('ETag') is not None:
+            headers['If-None-Match'] = entry[0]['headers']['ETag']
+        if entry[0].get('headers', {}).get('Last-Modified') is not None:
+            headers['If-Modified-Since'] = entry[0]['headers']['Last-Modified']
+
+    try:
+        r = FDNetwork.get(url, params=params, headers=headers, session=session)
+    except requests.exceptions.RequestException:
+        if entry is None:
+            raise
+        return fromEntry(entry, stale=True)
+
+    # 内容未改变，刷新缓存时间
+    if r.status_code == 304 and entry is not None:
+        entry[0]['fetched'] = time.time()
+        saveEntry(key, entry[0])
+        return fromEntry(entry)
+
+    # 请求失败(例如超出请求次数限制)时使用过期的缓存
+    if not r.ok:
+        if entry is not None:
+            return fromEntry(entry, stale=True)
+        return CachedResponse(url, r.status_code, r.content, dict(r.headers))
+
+    response_headers = dict((name, r.headers.get(name)) for name in cached_headers if name in r.headers)
+    saveEntry(key,
+              {'url': url, 'status': r.status_code, 'headers': response_headers,
+               'fetched': time.time(), 'length': len(r.content)},
+              r.content)
+    return CachedResponse(url, r.status_code, r.content, response_headers)
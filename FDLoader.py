@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PySide2.QtCore import QThread, Signal
+
+import FDBundle
+import FDCatalog
+import FDDuplicate
+import FDStore
+import FDTemplate
+
+# 每批返回给界面的模板文件数量
+batch_size = 64
+# 两批之间的最长间隔(秒)，避免界面长时间没有更新
+batch_interval = 0.1
+
+
+class TemplateLoader(QThread):
+    # 在后台线程中遍历模板文件目录，并用线程池并行读取、计算hash和校验模板文件
+
+    # 一批载入结果: [(显示名称, 文件路径, 缓存条目)]，条目为None表示文件拓展名不支持，模板包的条目包含 bundle
+    # 使用模板数据库时文件路径为数据库文件路径
+    batchLoaded = Signal(list)
+    # 载入进度: (已处理数量, 总数量)
+    progress = Signal(int, int)
+    # 载入结束: 是否被取消
+    loadFinished = Signal(bool)
+
+    def __init__(self, catalog: FDCatalog.Catalog = None, template_dir: str = "FDTemplates", parent=None,
+                 store_path: str = None, lazy: bool = False):
+        super().__init__(parent)
+        self.catalog = catalog
+        self.template_dir = template_dir
+        # 模板数据库文件，不为空时从数据库而不是模板文件目录载入模板
+        self.store_path = store_path
+        self.lazy = catalog.lazy if catalog is not None else lazy
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def loadFile(self, item):
+        display_name, file_path = item
+        if self.cancelled.is_set() or file_path is None:
+            return display_name, file_path, None
+        if FDBundle.isBundle(file_path):
+            return display_name, file_path, self.loadBundle(file_path)
+        return display_name, file_path, self.withSignature(self.catalog.loadFile(file_path))
+
+    @staticmethod
+    def withSignature(entry):
+        # 在后台线程中计算相似模板签名，签名不写入模板目录缓存
+        data = entry.get('data')
+        if data is None or data.get('content') is None or FDTemplate.isConfig(data):
+            return entry
+        entry = dict(entry)
+        entry['signature'] = FDDuplicate.signature(data.get('content'))
+        return entry
+
+    def loadBundle(self, file_path):
+        # 读取模板包索引，懒加载模式下不解码模板内容
+        try:
+            bundle = FDBundle.openBundle(file_path)
+            entries = []
+            for index in range(len(bundle)):
+                data = bundle.metadata(index) if self.lazy else bundle.template(index)
+                data['bundle_index'] = index
+                entries.append(self.withSignature({'hash': bundle.hash(index), 'data': data}))
+        except (FDTemplate.TemplateError, OSError, UnicodeDecodeError):
+            return {'error': "模板包文件已损坏或无法读取"}
+        return {'bundle': entries}
+
+    def loadStore(self, store, configs):
+        # 逐个读取模板数据库中的模板，配置项先于模板载入
+        for config in configs:
+            yield self.store_path, self.store_path, {'hash': None, 'data': config}
+        for template_id, hash_value, data in store.templates(self.lazy):
+            yield ("{0}#{1}".format(self.store_path, data.get('name')),
+                   self.store_path,
+                   self.withSignature({'hash': hash_value, 'data': data}))
+
+    def emitResults(self, results, total: int) -> None:
+        # 分批返回载入结果
+        batch = []
+        last_emit = time.monotonic()
+        cnt = 0
+
+        for result in results:
+            if self.cancelled.is_set():
+                break
+
+            batch.append(result)
+            cnt += 1
+
+            if len(batch) >= batch_size or time.monotonic() - last_emit >= batch_interval:
+                self.batchLoaded.emit(batch)
+                self.progress.emit(cnt, total)
+                batch = []
+                last_emit = time.monotonic()
+
+        if batch and not self.cancelled.is_set():
+            self.batchLoaded.emit(batch)
+            self.progress.emit(cnt, total)
+
+    def run(self) -> None:
+
+        # 从模板数据库载入
+        if self.store_path is not None:
+            try:
+                store = FDStore.Store(self.store_path)
+            except FDTemplate.TemplateError as e:
+                self.batchLoaded.emit([(self.store_path, self.store_path, {'error': str(e)})])
+                self.loadFinished.emit(False)
+                return
+            try:
+                configs = store.configs()
+                total = len(configs) + len(store)
+                self.progress.emit(0, total)
+                self.emitResults(self.loadStore(store, configs), total)
+            finally:
+                store.close()
+            self.loadFinished.emit(self.cancelled.is_set())
+            return
+
+        # 遍历模板文件目录，保持与 os.walk 相同的顺序
+        items = []
+        for path, dir_list, file_list in os.walk(self.template_dir):
+            for file_name in file_list:
+                display_name = path + "\\" + file_name
+                if not file_name.find(".json") == -1 or FDBundle.isBundle(file_name):
+                    items.append((display_name, os.path.join(path, file_name)))
+                else:
+                    items.append((display_name, None))
+
+        total = len(items)
+        self.progress.emit(0, total)
+
+        with ThreadPoolExecutor() as executor:
+
+            # 按提交顺序取回结果，保证重复模板的判定与单线程载入一致
+            self.emitResults(executor.map(self.loadFile, items), total)
+            if self.cancelled.is_set():
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        self.loadFinished.emit(self.cancelled.is_set())
@@ -2,14 +2,25 @@ import time
 import sys
 import os
 import json
+import sqlite3
 import pyperclip
-import requests
-import hashlib
 
-from PySide2.QtWidgets import QMessageBox
+from PySide2.QtCore import Qt, QTimer, QFileSystemWatcher, QPoint
+from PySide2.QtGui import QTextCursor
+from PySide2.QtWidgets import QMessageBox, QMenu, QComboBox, QListView
 from PySide2.QtUiTools import QUiLoader
 
+import FDBundle
+import FDCache
+import FDCatalog
+import FDDuplicate
+import FDLoader
+import FDModel
 import FDRescue
+import FDReplace
+import FDSearch
+import FDStore
+import FDTemplate
 import global_var
 import FDDebug
 import FDUtility
@@ -24,12 +35,32 @@ class FDMain:
 
     # 正在读取模板
     loading_templates = False
+    # 后台模板载入线程
+    loader = None
+    # 模板目录缓存
+    catalog = None
+    # 启动后是否已经检查更新
+    update_checked = False
+    # 显示更新窗口命令的版本信息获取线程
+    release_worker = None
+    # 模板文件目录监视器，监视模式下模板文件的改动会被逐个应用
+    watcher = None
+    # 上次载入时的模板包: 文件路径 -> (文件大小, 修改时间)，模板包改动时重新载入模板
+    bundle_files = {}
     # 当前模板
     current_template = {}
     # 当前替换内容字典
     replacements = {}
     # 当前替换对象
     current_replacement = ""
+    # 实时预览中输出区各关键词槽位: [关键词, 起始位置, 长度]，位置以Qt文本的UTF-16长度计; None表示需要完整重新生成
+    preview_slots = None
+    # 实时预览中输出区的预期长度，用于检测输出区是否被其他操作改动
+    preview_length = 0
+    # 实时预览中当前模板的关键词集合
+    preview_keywords = set()
+    # 等待实时预览的改动关键词
+    preview_changed = set()
 
     def __init__(self) -> None:
 
@@ -50,13 +81,25 @@ class FDMain:
             global_var.set_config('discovered_eggs', {})
 
         # 绑定按钮事件
-        self.ui.buttonRefreshList.clicked.connect(self.loadTemplates)
+        self.ui.buttonRefreshList.clicked.connect(self.refreshTemplates)
         self.ui.buttonReplace.clicked.connect(self.replaceContext)
         self.ui.buttonCopy.clicked.connect(self.copyResult)
         self.ui.buttonQuit.clicked.connect(self.quitProgram)
         self.ui.buttonEggs.clicked.connect(self.showEggs)
         self.ui.buttonMenu.clicked.connect(self.openMenu)
 
+        # 模板列表模型，模板列表框通过筛选排序模型显示模板列表
+        self.model = FDModel.TemplateListModel(self.ui)
+        self.proxy = FDModel.TemplateFilterModel(self.model, self.ui)
+        self.ui.comboBox.setModel(self.proxy)
+
+        # 不按所有模板名称计算列表框宽度，下拉列表中所有行高度相同并分批布局，只绘制可见的行
+        self.ui.comboBox.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        view = self.ui.comboBox.view()
+        view.setUniformItemSizes(True)
+        view.setLayoutMode(QListView.Batched)
+        view.setBatchSize(256)
+
         # 绑定下模板选择框事件
         self.ui.comboBox.currentIndexChanged.connect(self.showTemplate)
 
@@ -67,6 +110,35 @@ class FDMain:
         self.ui.lineCustomKeyword.textEdited.connect(self.customKeyword)
         self.ui.lineReplacement.textEdited.connect(self.replacementChange)
 
+        # 实时预览防抖计时器，停止输入一段时间后才更新输出区
+        self.preview_timer = QTimer(self.ui)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(150)
+        self.preview_timer.timeout.connect(self.updatePreview)
+
+        # 模板文件改动防抖计时器，短时间内的多次改动合并为一次应用
+        self.watch_timer = QTimer(self.ui)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(200)
+        self.watch_timer.timeout.connect(self.applyChanges)
+
+        # 模板名称筛选防抖计时器
+        self.filter_timer = QTimer(self.ui)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(200)
+        self.filter_timer.timeout.connect(self.filterTemplates)
+
+        # 载入模板进度条，仅在载入期间显示
+        self.ui.progressLoad.setVisible(False)
+
+        # 绑定搜索框事件，筛选模板名称和搜索模板内容通过搜索内容开关切换，搜索内容时不筛选模板名称
+        self.ui.lineSearch.returnPressed.connect(self.searchTemplates)
+        self.ui.lineSearch.textEdited.connect(self.searchEdited)
+        self.ui.checkSearchContent.toggled.connect(self.searchModeToggled)
+
+        # 绑定实时预览开关事件
+        self.ui.checkLivePreview.toggled.connect(self.livePreviewToggled)
+
         if __name__ == '__main__':
             FDDebug.debug("主界面初始化完成", type='success')
 
@@ -80,111 +152,393 @@ class FDMain:
 
     def loadTemplates(self):
 
+        # 若正在载入模板则先取消先前的载入
+        if self.loader is not None and self.loader.isRunning():
+            self.loader.cancel()
+            self.loader.wait()
+
+        # 完整载入期间停止监视模板文件目录
+        self.stopWatching()
+
         # 读取模板，防止改变列表框列表而触发显示模板
         self.loading_templates = True
         # 清空框架选择列表框和框架列表
-        self.ui.comboBox.clear()
-        global_var.templates_clear()
+        self.ui.comboBox.blockSignals(True)
+        self.model.clear()
+        self.ui.comboBox.blockSignals(False)
         global_var.templates_hash_clear()
+        FDSearch.clear()
+        FDDuplicate.clear()
 
         FDDebug.debug("开始载入模板...")
 
+        # 懒加载模式下只载入模板元数据，模板内容在选择模板时才读取
+        # 配置文件随模板一同载入，首次载入前使用上次运行时的设置，载入后设置不同时重新载入
+        if 'lazy_templates' in global_var.config_keys():
+            lazy = global_var.get_config('lazy_templates') is True
+        else:
+            lazy = FDCatalog.lastLazy()
+        if lazy:
+            # 不保留先前完整载入时编译的模板
+            for hash_value in global_var.templates_compiled_keys():
+                global_var.templates_compiled_pop(hash_value)
+
+        # 使用模板数据库时从数据库载入模板，不使用模板目录缓存
+        if FDStore.isEnabled():
+            self.catalog = None
+            loader = FDLoader.TemplateLoader(store_path=FDStore.store_path, lazy=lazy)
+
         # 若不存在模板文件夹则建立并从云端同步模板
-        if not os.path.exists("FDTemplates"):
+        elif not os.path.exists("FDTemplates"):
+            self.loading_templates = False
             QMessageBox.critical(self.ui, "错误",
                                  "模板文件夹不存在或已损坏\n正在建立新的模板文件夹并从云端同步模板文件")
             FDUtility.syncTemplates()
             return
 
-        # 默认模板文件目录
-        template_dir = os.walk("FDTemplates")
+        else:
+            # 模板目录缓存，未改动的模板文件无需重新读取和计算hash
+            self.catalog = FDCatalog.Catalog(lazy=lazy)
 
-        # 遍历模板文件目录
-        for path, dir_list, file_list in template_dir:
-            for file_name in file_list:
+            # 在后台线程中并行读取模板文件，结果分批返回到界面线程
+            loader = FDLoader.TemplateLoader(self.catalog)
 
-                # 检查文件拓展名是否合法
-                if not file_name.find(".json") == -1:
-                    with open(os.path.abspath(path) + "\\" + file_name, 'rb') as f:
-                        # hash
-                        data = f.read()
-                        hash_obj = hashlib.sha1()
-                        hash_str = "blob %u\0" % len(data) + data.decode('utf-8')
-                        hash_obj.update(hash_str.encode('utf-8'))
-                        hash_value = hash_obj.hexdigest()
-
-                    # 打开模板文件
-                    with open(os.path.abspath(path) + "\\" + file_name, 'rb') as load_json:
-
-                        # 模板文件字典
-                        data = {}
-                        # 缺少的键值对
-                        missed_keys = []
-                        # 显示的相对路径名称
-                        display_name = path + "\\" + file_name
-
-                        # 尝试读取模板文件并转换为字典
-                        try:
-                            original_data = json.load(load_json)
-
-                        # 解码失败异常：一般是内容为空或者不合法
-                        except json.decoder.JSONDecodeError:
-                            FDDebug.debug(
-                                "已损坏的模板文件：{0}, 模板文件内容为空或不合法, 跳过当前模板文件".format(display_name),
-                                type='error')
-                            continue
-                        except UnicodeDecodeError:
-                            FDDebug.debug(
-                                "已损坏的模板文件：{0}, 模板文件编码格式有误, 跳过当前模板文件".format(display_name),
-                                type='error')
-                            continue
-
-                        # 将键全部转换为小写，避免大小写混淆
-                        for key, value in original_data.items():
-                            data[key.lower()] = value
-
-                        # 检测是否是配置文件
-                        if 'config' in data.keys():
-                            FDDebug.debug("发现配置文件：{0}, 开始解析".format(display_name))
-                            self.applyConfig(data)
-                            continue
-
-                        # 检测是否有缺失的必需键值对
-                        for checked_key in ['name', 'content', 'rolename', 'roledes']:
-                            if checked_key not in data.keys():
-                                missed_keys.append(checked_key)
-
-                        # 如果有缺失的关键键值对
-                        if not len(missed_keys) == 0:
-                            FDDebug.debug("已损坏的模板文件：{0}, 缺失如下键值对:{1}, 跳过当前模板文件".format(
-                                display_name,
-                                missed_keys)
-                                , type='error')
-                            continue
-
-                        # 检测是否已经添加了相同的模板
-                        elif hash_value in global_var.templates_hash_keys():
-                            FDDebug.debug("已经载入相同的模板文件: {0}, 跳过当前模板文件".format(
-                                global_var.get_templates_hash(hash_value))
-                                , type='warn')
-                            continue
-
-                        # 将模板添加到模板列表和模板列表框中
-                        global_var.templates_append(data)
-                        global_var.set_templates_hash(hash_value, data.get('name'))
-                        self.ui.comboBox.addItem(data.get('name'))
-
-                    FDDebug.debug("已载入模板文件: " + data.get('name'))
-
-                # 文件拓展名不为.json
-                else:
-                    FDDebug.debug("不支持的文件类型(目前仅支持.json格式)：{0}, 跳过当前模板文件".format(display_name),
-                                  type='error')
+        loader.batchLoaded.connect(lambda batch: self.addTemplates(loader, batch), Qt.QueuedConnection)
+        loader.progress.connect(lambda cnt, total: self.loadProgress(loader, cnt, total), Qt.QueuedConnection)
+        loader.loadFinished.connect(lambda cancelled: self.loadFinished(loader, cancelled), Qt.QueuedConnection)
+        self.loader = loader
+
+        # 显示载入进度，载入期间刷新按钮用于取消载入
+        self.ui.progressLoad.setValue(0)
+        self.ui.progressLoad.setVisible(True)
+        self.ui.buttonRefreshList.setText("取消载入")
+
+        self.loader.start()
+
+    def refreshTemplates(self):
+
+        # 正在载入时取消载入，否则重新载入模板
+        if self.loading_templates and self.loader is not None and self.loader.isRunning():
+            FDDebug.debug("已取消载入模板", type='warn')
+            self.loader.cancel()
+            return
+
+        # 监视模式下只应用改动的模板文件
+        if self.watcher is not None:
+            self.applyChanges()
+            return
+
+        self.loadTemplates()
+
+    def addTemplates(self, loader, batch):
+
+        # 忽略已被取消的载入返回的结果
+        if loader is not self.loader:
+            return
+
+        # 将后台载入的一批模板添加到模板列表和模板列表框中
+        self.ui.comboBox.blockSignals(True)
+        current_row = self.currentRow()
+
+        for display_name, file_path, entry in batch:
+            self.addTemplate(display_name, file_path, entry)
+
+        # 一批模板作为一次行插入添加到模板列表框
+        self.model.sync()
 
-        self.ui.comboBox.setCurrentIndex(-1)
+        # 载入过程中不自动选择模板，保留用户已经做出的选择
+        self.setCurrentRow(current_row)
+        self.ui.comboBox.blockSignals(False)
+
+    def addTemplate(self, display_name, file_path, entry, index=None) -> bool:
+
+        # 添加一个载入的模板文件，指定序号时替换该位置的模板，返回是否成功添加
+
+        # 文件拓展名不为.json或.fdb
+        if entry is None:
+            FDDebug.debug("不支持的文件类型(目前仅支持.json和.fdb格式)：{0}, 跳过当前模板文件".format(display_name),
+                          type='error')
+            return False
+
+        # 模板包: 逐个添加模板包中的模板
+        if entry.get('bundle') is not None:
+            cnt = 0
+            for bundle_entry in entry.get('bundle'):
+                if self.addTemplate("{0}#{1}".format(display_name, bundle_entry.get('data').get('name')),
+                                    file_path,
+                                    bundle_entry):
+                    cnt += 1
+            FDDebug.debug("已载入模板包: {0}, 共载入{1}个模板".format(display_name, cnt))
+            return cnt > 0
+
+        # 模板文件已损坏：内容为空、不合法、编码有误或缺失必需的键值对
+        if entry.get('error') is not None:
+            FDDebug.debug("已损坏的模板文件：{0}, {1}, 跳过当前模板文件".format(display_name, entry.get('error')),
+                          type='error')
+            return False
+
+        # 模板文件字典
+        data = dict(entry.get('data'))
+        hash_value = entry.get('hash')
+
+        # 检测是否是配置文件
+        if FDTemplate.isConfig(data):
+            FDDebug.debug("发现配置文件：{0}, 开始解析".format(display_name))
+            self.applyConfig(data)
+            return False
+
+        # 检测是否已经添加了相同的模板
+        elif hash_value in global_var.templates_hash_keys():
+            FDDebug.debug("已经载入相同的模板文件: {0}, 跳过当前模板文件".format(
+                global_var.get_templates_hash(hash_value))
+                , type='warn')
+            return False
+
+        # 预编译模板，模板文件未改动时沿用先前编译的结果，懒加载模式下在选择模板时才编译
+        if 'content' in data and global_var.get_templates_compiled(hash_value) is None:
+            global_var.set_templates_compiled(hash_value, FDReplace.compileTemplate(data))
+        data['hash'] = hash_value
+        data['path'] = file_path
+
+        # 将模板内容加入搜索索引，懒加载模式下只索引模板名称和关键词
+        FDSearch.add(hash_value,
+                     data.get('name'),
+                     data.get('content') if 'content' in data else "\n".join(data.get('rolename')))
+
+        # 将模板加入相似模板索引，懒加载模式下没有模板内容，不参与相似模板检测
+        if 'content' in data:
+            FDDuplicate.add(hash_value, data.get('name'), data.get('content'), entry.get('signature'))
+
+        # 将模板添加到模板列表中，新增的模板在模型 sync 时才插入模板列表框
+        global_var.set_templates_hash(hash_value, data.get('name'))
+        if index is None:
+            global_var.templates_append(data)
+        else:
+            self.model.setTemplate(index, data)
+
+        FDDebug.debug("已载入模板文件: " + data.get('name'))
+        return True
+
+    def loadProgress(self, loader, cnt, total):
+        if loader is not self.loader:
+            return
+        self.ui.progressLoad.setMaximum(max(total, 1))
+        self.ui.progressLoad.setValue(cnt)
+
+    def loadFinished(self, loader, cancelled):
+        if loader is not self.loader:
+            return
+
+        self.ui.progressLoad.setVisible(False)
+        self.ui.buttonRefreshList.setText("刷新模板列表")
         self.loading_templates = False
+
+        if cancelled:
+            FDDebug.debug("模板载入已取消,已载入{0}个模板文件".format(global_var.len_templates()), type='warn')
+            return
+
+        # 保存模板目录缓存
+        if self.catalog is not None:
+            self.catalog.save()
+            self.bundle_files = self.bundleFiles()
+
+        # 配置文件中的懒加载设置与本次载入方式不同时按新的设置重新载入
+        lazy = global_var.get_config('lazy_templates') is True
+        FDCatalog.saveLazy(lazy)
+        if not lazy == loader.lazy:
+            FDDebug.debug("懒加载设置已改变，重新载入模板", type='warn')
+            self.loadTemplates()
+            return
+
+        # 按配置项对模板列表框排序
+        self.proxy.setSorted(global_var.get_config('sort_templates') is True)
+
+        # 移除已被删除或改动的模板的编译结果和生成缓存
+        for hash_value in global_var.templates_compiled_keys():
+            if hash_value not in global_var.templates_hash_keys():
+                global_var.templates_compiled_pop(hash_value)
+                FDCache.invalidate(hash_value)
+        FDDebug.set_cache_stats(FDCache.stats())
+
         FDDebug.debug("模板载入完成,共载入{0}个模板文件".format(global_var.len_templates()), type='success')
 
+        # 监视模板文件目录，模板数据库只通过本程序改动，无需监视
+        if global_var.get_config('watch_templates') is True and self.catalog is not None:
+            self.startWatching()
+
+        # 首次载入完成后在后台检查更新，此时已应用配置文件中忽略的版本和检查间隔
+        if not self.update_checked:
+            self.update_checked = True
+            FDUtility.checkUpdate(startup=True)
+
+    def startWatching(self):
+
+        # 监视模板文件目录及所有模板文件
+        if self.watcher is None:
+            self.watcher = QFileSystemWatcher(self.ui)
+            self.watcher.directoryChanged.connect(self.templatesChanged)
+            self.watcher.fileChanged.connect(self.templatesChanged)
+            FDDebug.debug("已开始监视模板文件目录")
+
+        paths = [path for path, dir_list, file_list in os.walk("FDTemplates")]
+        paths += list(self.catalog.entries.keys())
+        paths += list(self.bundle_files.keys())
+        watched = set(self.watcher.directories() + self.watcher.files())
+        new_paths = [path for path in paths if path not in watched]
+        if new_paths:
+            self.watcher.addPaths(new_paths)
+
+    def stopWatching(self):
+
+        # 停止监视模板文件目录
+        if self.watcher is None:
+            return
+        self.watch_timer.stop()
+        self.watcher.deleteLater()
+        self.watcher = None
+        FDDebug.debug("已停止监视模板文件目录")
+
+    def templatesChanged(self, path):
+        FDDebug.debug("模板文件发生改动: {0}".format(path))
+        self.watch_timer.start()
+
+    @staticmethod
+    def bundleFiles():
+
+        # 模板文件目录中的模板包及其大小和修改时间
+        bundles = {}
+        for path, dir_list, file_list in os.walk("FDTemplates"):
+            for file_name in file_list:
+                if not FDBundle.isBundle(file_name):
+                    continue
+                file_path = os.path.join(path, file_name)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    continue
+                bundles[file_path] = (stat.st_size, stat.st_mtime_ns)
+        return bundles
+
+    def templateIndex(self, file_path):
+
+        # 查找模板文件在模板列表中的序号
+        for index in range(global_var.len_templates()):
+            if global_var.get_templates(index).get('path') == file_path:
+                return index
+        return None
+
+    def applyChanges(self):
+
+        # 只应用新增、改动和删除的模板文件，不重新载入整个模板列表
+        if self.loading_templates or self.catalog is None:
+            return
+
+        if not os.path.exists("FDTemplates"):
+            self.loadTemplates()
+            return
+
+        # 模板包中的模板不在模板目录缓存中，模板包新增、改动或删除时重新载入模板
+        if not self.bundleFiles() == self.bundle_files:
+            FDDebug.debug("模板包发生改动，重新载入模板")
+            self.loadTemplates()
+            return
+
+        # 当前模板文件: 文件路径 -> 显示名称
+        current_files = {}
+        for path, dir_list, file_list in os.walk("FDTemplates"):
+            for file_name in file_list:
+                if not file_name.find(".json") == -1:
+                    current_files[os.path.join(path, file_name)] = path + "\\" + file_name
+
+        removed_files = [file_path for file_path in self.catalog.entries.keys() if file_path not in current_files]
+        changed_files = [file_path for file_path in current_files.keys() if self.catalog.isChanged(file_path)]
+
+        if len(removed_files) == 0 and len(changed_files) == 0:
+            return
+
+        self.ui.comboBox.blockSignals(True)
+        current_index = self.currentRow()
+        # 当前选择的模板是否被移除或在原位置被替换，列表框信号被屏蔽，应用改动后再更新显示
+        current_removed = False
+        current_replaced = False
+
+        # 被移除或改动的模板hash
+        freed_hashes = []
+
+        def removeAt(index):
+            nonlocal current_index, current_removed
+            self.model.removeTemplate(index)
+            if index == current_index:
+                FDDebug.debug("当前选择的模板已被删除或改动", type='warn')
+                current_index = -1
+                current_removed = True
+            elif index < current_index:
+                current_index -= 1
+
+        # 删除的模板文件
+        for file_path in removed_files:
+            self.catalog.removeFile(file_path)
+            index = self.templateIndex(file_path)
+            if index is not None:
+                freed_hashes.append(global_var.get_templates(index).get('hash'))
+                global_var.templates_hash_pop(freed_hashes[-1])
+                removeAt(index)
+            FDDebug.debug("已移除模板文件: {0}".format(file_path))
+
+        # 新增或改动的模板文件
+        for file_path in changed_files:
+            index = self.templateIndex(file_path)
+            entry = self.catalog.loadFile(file_path)
+
+            if index is None:
+                self.addTemplate(current_files[file_path], file_path, entry)
+                continue
+
+            # 在原位置替换改动的模板，保持模板列表顺序
+            freed_hashes.append(global_var.get_templates(index).get('hash'))
+            global_var.templates_hash_pop(freed_hashes[-1])
+            if not self.addTemplate(current_files[file_path], file_path, entry, index):
+                removeAt(index)
+            elif index == current_index:
+                current_replaced = True
+
+        # 被移除的模板若还有相同的模板文件，则改为载入该文件
+        for hash_value in freed_hashes:
+            if hash_value in global_var.templates_hash_keys():
+                continue
+            for file_path, entry in list(self.catalog.entries.items()):
+                if entry.get('hash') == hash_value and file_path in current_files \
+                        and self.templateIndex(file_path) is None:
+                    self.addTemplate(current_files[file_path], file_path, entry)
+                    break
+
+        # 移除不再使用的编译结果、生成缓存、搜索索引和相似模板索引
+        for hash_value in freed_hashes:
+            if hash_value not in global_var.templates_hash_keys():
+                global_var.templates_compiled_pop(hash_value)
+                FDCache.invalidate(hash_value)
+                FDSearch.remove(hash_value)
+                FDDuplicate.remove(hash_value)
+
+        self.model.sync()
+        self.setCurrentRow(current_index)
+        self.ui.comboBox.blockSignals(False)
+
+        # 当前模板被删除(或改动后被筛选掉)时清空显示，被改动时重新显示改动后的模板
+        if current_removed or (current_replaced and self.currentRow() == -1):
+            self.clearTemplate()
+        elif current_replaced:
+            self.showTemplate()
+
+        self.catalog.save()
+        if self.watcher is not None:
+            self.startWatching()
+
+        FDDebug.debug("已应用模板文件改动: 删除{0}个, 新增或改动{1}个, 当前共{2}个模板文件".format(
+            len(removed_files),
+            len(changed_files),
+            global_var.len_templates()), type='success')
+
     def applyConfig(self, config_file):
         # 应用配置文件
 
@@ -203,7 +557,11 @@ class FDMain:
             return
 
         # 可用配置项
-        valid_keys = ['ignored_version', 'allow_command', 'discovered_eggs', 'enable_debug']
+        valid_keys = ['ignored_version', 'allow_command', 'discovered_eggs', 'enable_debug',
+                      'render_cache_size', 'render_cache_memory', 'lazy_templates', 'lazy_cache_size',
+                      'watch_templates', 'sort_templates', 'http_cache_ttl', 'offline_mode',
+                      'delta_sync', 'sync_mirror_dir', 'sync_policy', 'update_check_interval',
+                      'mirror_url', 'endpoints']
 
         # 配置项计数
         cnt = 0
@@ -273,26 +631,142 @@ class FDMain:
 
         FDDebug.debug("配置文件解析完成，共应用了{}个配置项".format(cnt), type='success')
 
+    def currentRow(self) -> int:
+        # 模板列表框当前选择的模板在模板列表中的序号，未选择时为-1
+        return self.proxy.sourceRow(self.ui.comboBox.currentIndex())
+
+    def setCurrentRow(self, row) -> None:
+        # 按模板列表中的序号选择模板，模板被筛选掉时不选择任何模板
+        self.ui.comboBox.setCurrentIndex(self.proxy.proxyRow(row))
+
+    def clearTemplate(self):
+
+        # 清空当前模板的显示和替换内容
+        self.current_template = {}
+        self.replacements.clear()
+        self.current_replacement = ""
+        self.preview_slots = None
+        self.preview_changed.clear()
+        self.ui.textResult.clear()
+        self.ui.listKeyword.clear()
+        self.ui.lineReplacement.clear()
+
     def showTemplate(self):
 
-        # 若还未完成读取则不显示模板
-        if self.loading_templates:
+        # 未选择任何模板时不显示模板
+        row = self.currentRow()
+        if row == -1:
             return
 
         # 重置替换关键词字典
         self.replacements.clear()
         self.current_replacement = ""
 
-        self.current_template = global_var.get_templates(self.ui.comboBox.currentIndex())
+        self.current_template = global_var.get_templates(row)
+
+        # 读取模板内容，懒加载模式下模板内容此时才从文件读取
+        compiled = self.getCompiled()
+        if compiled is None:
+            self.current_template = {}
+            return
 
         # 将选择的模板输出
-        self.ui.textResult.setText(self.current_template.get('content'))
+        self.preview_changed.clear()
+        if self.ui.checkLivePreview.isChecked():
+            self.renderPreview()
+        else:
+            self.preview_slots = None
+            self.ui.textResult.setText(compiled.content)
         FDDebug.debug("已选择模板:" + self.ui.comboBox.currentText())
 
         # 将模板的关键词加入到关键词列表
         self.ui.listKeyword.clear()
         self.ui.listKeyword.addItems(self.current_template.get('rolename'))
 
+    def searchEdited(self):
+
+        # 筛选模式下输入时筛选模板名称，搜索内容模式下按回车才搜索
+        if not self.ui.checkSearchContent.isChecked():
+            self.filter_timer.start()
+
+    def searchModeToggled(self, checked):
+
+        # 切换搜索模式，搜索内容时清除模板名称筛选，切换回筛选模式时按搜索框中的内容筛选
+        self.filter_timer.stop()
+        if checked:
+            self.ui.lineSearch.setPlaceholderText("输入模板内容，按回车搜索")
+        else:
+            self.ui.lineSearch.setPlaceholderText("输入以筛选模板名称")
+        self.filterTemplates()
+
+    def searchTemplates(self):
+
+        # 筛选模式下按回车立即筛选
+        if not self.ui.checkSearchContent.isChecked():
+            self.filter_timer.stop()
+            self.filterTemplates()
+            return
+
+        # 在模板内容中搜索，并在搜索框下方列出匹配的模板
+        query = self.ui.lineSearch.text()
+        if query.strip() == "":
+            return
+
+        start_time = time.perf_counter()
+        results = self.search(query)
+        FDDebug.debug("搜索\"{0}\"找到{1}个模板, 用时{2:.1f}ms".format(
+            query,
+            len(results),
+            (time.perf_counter() - start_time) * 1000))
+
+        menu = QMenu(self.ui)
+        if len(results) == 0:
+            menu.addAction("没有找到匹配的模板").setEnabled(False)
+        for template_hash, name, score in results:
+            action = menu.addAction(name)
+            action.triggered.connect(lambda checked=False, selected=template_hash: self.selectTemplate(selected))
+        menu.popup(self.ui.lineSearch.mapToGlobal(QPoint(0, self.ui.lineSearch.height())))
+
+    def filterTemplates(self):
+
+        # 按搜索框中的内容筛选模板列表框中的模板名称，保持当前选择的模板，搜索内容模式下显示所有模板
+        self.ui.comboBox.blockSignals(True)
+        row = self.currentRow()
+        if row == -1 and not self.current_template == {}:
+            row = self.model.findHash(self.current_template.get('hash'))
+        if self.ui.checkSearchContent.isChecked():
+            self.proxy.setFilterFixedString("")
+        else:
+            self.proxy.setFilterFixedString(self.ui.lineSearch.text().strip())
+        self.setCurrentRow(row)
+        self.ui.comboBox.blockSignals(False)
+
+    @staticmethod
+    def search(query):
+
+        # 使用模板数据库时通过数据库的全文索引搜索，懒加载模式下也能搜索模板内容
+        if FDStore.isEnabled():
+            try:
+                store = FDStore.openStore()
+                if store.fts:
+                    return store.search(query)
+            except (FDTemplate.TemplateError, sqlite3.Error) as e:
+                FDDebug.debug("模板数据库搜索失败: {0}".format(e), type='error')
+        return FDSearch.search(query)
+
+    def selectTemplate(self, template_hash):
+
+        # 选择搜索结果中的模板，模板名称被筛选掉时清除筛选
+        row = self.model.findHash(template_hash)
+        if row == -1:
+            return
+        if self.proxy.proxyRow(row) == -1:
+            self.filter_timer.stop()
+            self.ui.comboBox.blockSignals(True)
+            self.proxy.setFilterFixedString("")
+            self.ui.comboBox.blockSignals(False)
+        self.setCurrentRow(row)
+
     def keywordChange(self):
 
         # 清空自定义关键词输入框
@@ -311,6 +785,19 @@ class FDMain:
         else:
             self.ui.lineReplacement.clear()
 
+    def releaseFetched(self, worker, json_data):
+        if worker is not self.release_worker:
+            return
+        self.release_worker = None
+        FDUpdate.set_data(json_data)
+        FDUpdate.display()
+
+    def releaseFailed(self, worker, message):
+        if worker is not self.release_worker:
+            return
+        self.release_worker = None
+        FDDebug.debug(message, type='error')
+
     def customKeyword(self):
 
         if self.ui.textResult.toPlainText() == "EnableDebugMode" \
@@ -339,9 +826,15 @@ class FDMain:
             self.ui.textResult.clear()
             self.ui.lineCustomKeyword.clear()
 
-            FDUpdate.set_data(requests.get(
-                url='https://api.github.com/repos/Pitrick3141/DontFDHere/releases/latest').json())
-            FDUpdate.display()
+            # 在后台线程中获取版本信息，获取完成后显示更新窗口，正在获取时忽略
+            if self.release_worker is not None:
+                return
+            worker = FDUpdate.CheckWorker(parent=self.ui)
+            worker.checked.connect(lambda json_data, stale: self.releaseFetched(worker, json_data),
+                                   Qt.QueuedConnection)
+            worker.failed.connect(lambda message: self.releaseFailed(worker, message), Qt.QueuedConnection)
+            self.release_worker = worker
+            worker.start()
 
         if self.ui.textResult.toPlainText() == "SyncTemplates" \
                 and self.ui.lineCustomKeyword.text() == "Check" \
@@ -388,6 +881,121 @@ class FDMain:
         if self.ui.lineReplacement.text() == "":
             self.replacements.pop(self.current_replacement)
 
+        # 实时预览: 记录改动的关键词并重新开始计时
+        if self.ui.checkLivePreview.isChecked() and not self.current_template == {}:
+            self.preview_changed.add(self.current_replacement)
+            self.preview_timer.start()
+
+    def livePreviewToggled(self, checked):
+
+        # 开启实时预览时立即生成一次完整预览
+        if checked and not self.current_template == {}:
+            self.preview_changed.clear()
+            self.renderPreview()
+        FDDebug.debug("实时预览已{}".format("开启" if checked else "关闭"))
+
+    def getCompiled(self) -> FDReplace.CompiledTemplate:
+
+        # 获取当前模板的预编译结果
+        template_hash = self.current_template.get('hash')
+        compiled = global_var.get_templates_compiled(template_hash)
+        if compiled is not None:
+            return compiled
+
+        # 懒加载模式下先查找最近使用的模板
+        compiled = FDCache.get_template(template_hash)
+        if compiled is not None:
+            return compiled
+
+        template = self.current_template
+        if 'content' not in template:
+            try:
+                template = dict(template)
+                if template.get('bundle_index') is not None:
+                    template['content'] = FDBundle.readContent(template.get('path'), template.get('bundle_index'))
+                elif template.get('store_id') is not None:
+                    template['content'] = FDStore.readContent(template.get('store_id'))
+                else:
+                    template['content'] = FDTemplate.readContent(template.get('path'))
+            except (FDTemplate.TemplateError, OSError, UnicodeDecodeError, sqlite3.Error):
+                FDDebug.debug("模板文件读取失败: {0}, 请刷新模板列表".format(template.get('path')), type='error')
+                return None
+            FDDebug.debug("已读取模板内容: {0}".format(template.get('path')))
+
+        compiled = FDReplace.compileTemplate(template)
+        FDCache.put_template(template_hash, compiled)
+        return compiled
+
+    def renderCurrent(self) -> str:
+
+        # 生成当前模板的替换结果，优先使用缓存
+        template_hash = self.current_template.get('hash')
+        context = FDCache.get(template_hash, self.replacements)
+        if context is None:
+            compiled = self.getCompiled()
+            if compiled is None:
+                return None
+            context = compiled.render(self.replacements)
+            FDCache.put(template_hash, self.replacements, context)
+        FDDebug.set_cache_stats(FDCache.stats())
+        return context
+
+    def renderPreview(self):
+
+        # 完整生成预览并记录各关键词槽位在输出区中的位置
+        compiled = self.getCompiled()
+        context = self.renderCurrent()
+        if compiled is None or context is None:
+            self.preview_slots = None
+            return
+        self.ui.textResult.setPlainText(context)
+        self.preview_length = qtLength(context)
+
+        # 含有自定义关键词时槽位位置与模板不一致，无法局部更新
+        if any(keyword not in compiled.keywords for keyword in self.replacements.keys()):
+            self.preview_slots = None
+            return
+
+        self.preview_keywords = compiled.keywords
+        self.preview_slots = []
+        position = qtLength(compiled.literals[0])
+        for index, slot in enumerate(compiled.slots):
+            length = qtLength(self.replacements.get(slot, slot))
+            self.preview_slots.append([slot, position, length])
+            position += length + qtLength(compiled.literals[index + 1])
+
+    def updatePreview(self):
+
+        # 防抖计时结束，只替换输出区中改动关键词所在的片段
+        changed = self.preview_changed
+        self.preview_changed = set()
+
+        if self.current_template == {} or not self.ui.checkLivePreview.isChecked():
+            return
+
+        # 槽位失效、出现自定义关键词或输出区已被改动时完整重新生成
+        if self.preview_slots is None \
+                or any(keyword not in self.preview_keywords for keyword in changed) \
+                or self.ui.textResult.document().characterCount() - 1 != self.preview_length:
+            self.renderPreview()
+            return
+
+        cursor = QTextCursor(self.ui.textResult.document())
+        cursor.beginEditBlock()
+        offset = 0
+        for slot in self.preview_slots:
+            slot[1] += offset
+            if slot[0] not in changed:
+                continue
+            value = self.replacements.get(slot[0], slot[0])
+            cursor.setPosition(slot[1])
+            cursor.setPosition(slot[1] + slot[2], QTextCursor.KeepAnchor)
+            cursor.insertText(value)
+            offset += qtLength(value) - slot[2]
+            slot[2] = qtLength(value)
+        cursor.endEditBlock()
+        self.preview_length += offset
+
     def replaceContext(self):
 
         # 检测是否已经选择模板
@@ -400,17 +1008,17 @@ class FDMain:
             FDDebug.debug("没有输入任何替换的内容, 跳过此次替换", type='warn')
             return
 
-        # 获取模板内容
-        context = self.current_template.get('content')
-
-        # 遍历字典中替换对并逐一替换
+        # 填充模板中的关键词槽位
+        context = self.renderCurrent()
+        if context is None:
+            return
         for replacement in self.replacements.keys():
-            context = context.replace(replacement, self.replacements[replacement])
             FDDebug.debug("已将关键词\"{0}\"替换为\"{1}\"".format(replacement, self.replacements[replacement]))
         FDDebug.debug("关键词替换完成", type='success')
 
         # 输出替换后的内容
         self.ui.textResult.setText(context)
+        self.preview_slots = None
 
     def copyResult(self):
 
@@ -485,6 +1093,11 @@ class FDMain:
             return
 
 
+def qtLength(text: str) -> int:
+    # Qt文本位置以UTF-16编码单元计算，与Python字符串长度在BMP以外的字符上不同
+    return len(text.encode('utf-16-le')) // 2
+
+
 def init():
     global fdMain
     fdMain = FDMain()
@@ -496,10 +1109,32 @@ def display():
 
 
 def loadTemplates():
+    # 监视模式下只应用改动的模板文件
+    if fdMain.watcher is not None:
+        fdMain.applyChanges()
+    else:
+        fdMain.loadTemplates()
+    return
+
+
+def reloadTemplates():
+    # 模板存储方式改变后完整重新载入模板
+    fdMain.stopWatching()
     fdMain.loadTemplates()
     return
 
 
+def addTemplate(display_name, file_path, entry) -> bool:
+    # 添加导入的模板，不改变当前选择的模板
+    fdMain.ui.comboBox.blockSignals(True)
+    current_row = fdMain.currentRow()
+    added = fdMain.addTemplate(display_name, file_path, entry)
+    fdMain.model.sync()
+    fdMain.setCurrentRow(current_row)
+    fdMain.ui.comboBox.blockSignals(False)
+    return added
+
+
 def applyConfig(config):
     fdMain.applyConfig(config)
     return
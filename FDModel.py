@@ -0,0 +1,103 @@
+from PySide2.QtCore import Qt, QAbstractListModel, QModelIndex, QSortFilterProxyModel
+
+import global_var
+
+# 模板hash的数据角色
+HashRole = Qt.UserRole + 1
+
+
+class TemplateListModel(QAbstractListModel):
+    # 直接读取模板列表的列表模型，模板列表框不再逐个保存模板名称
+    # 模板列表是唯一的数据来源，模型只记录已经通知给视图的行数，新增的模板在 sync 时一次性插入
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 已经插入到视图中的行数
+        self.rows = 0
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return self.rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.rows:
+            return None
+        template = global_var.get_templates(index.row())
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return template.get('name')
+        if role == Qt.ToolTipRole:
+            return template.get('path')
+        if role == HashRole:
+            return template.get('hash')
+        return None
+
+    def sync(self) -> None:
+        # 将模板列表中新增的模板作为一批行插入
+        total = global_var.len_templates()
+        if total <= self.rows:
+            return
+        self.beginInsertRows(QModelIndex(), self.rows, total - 1)
+        self.rows = total
+        self.endInsertRows()
+
+    def clear(self) -> None:
+        # 清空模板列表
+        self.beginResetModel()
+        global_var.templates_clear()
+        self.rows = 0
+        self.endResetModel()
+
+    def removeTemplate(self, row: int) -> None:
+        # 从模板列表中移除一个模板，尚未插入视图的模板直接移除
+        if row >= self.rows:
+            global_var.templates_pop(row)
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        global_var.templates_pop(row)
+        self.rows -= 1
+        self.endRemoveRows()
+
+    def setTemplate(self, row: int, data: dict) -> None:
+        # 替换模板列表中的一个模板
+        global_var.set_templates(row, data)
+        if row < self.rows:
+            index = self.index(row, 0)
+            self.dataChanged.emit(index, index)
+
+    def findHash(self, template_hash: str) -> int:
+        # 查找模板在模板列表中的序号，不存在时返回-1
+        for row in range(global_var.len_templates()):
+            if global_var.get_templates(row).get('hash') == template_hash:
+                return row
+        return -1
+
+
+class TemplateFilterModel(QSortFilterProxyModel):
+    # 按模板名称筛选和排序模板列表，模板列表框通过该模型显示模板
+
+    def __init__(self, source: TemplateListModel, parent=None):
+        super().__init__(parent)
+        self.setSourceModel(source)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.setSortCaseSensitivity(Qt.CaseInsensitive)
+        self.setSortLocaleAware(True)
+
+    def sourceRow(self, row: int) -> int:
+        # 列表框中的序号 -> 模板列表中的序号
+        if row < 0:
+            return -1
+        return self.mapToSource(self.index(row, 0)).row()
+
+    def proxyRow(self, row: int) -> int:
+        # 模板列表中的序号 -> 列表框中的序号，模板被筛选掉时返回-1
+        if row < 0:
+            return -1
+        return self.mapFromSource(self.sourceModel().index(row, 0)).row()
+
+    def setSorted(self, enabled: bool) -> None:
+        # 按模板名称排序，或恢复为载入顺序
+        if enabled:
+            self.sort(0, Qt.AscendingOrder)
+        else:
+            self.sort(-1)
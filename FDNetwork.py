@@ -0,0 +1,123 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 共享网络客户端: 所有网络请求共用一个保持连接的会话，每个请求都有超时
+# 连接失败和服务器错误时按指数退避重试，记录GitHub返回的 X-RateLimit-* 响应头，请求次数即将用完时推迟请求
+
+# 连接超时和读取超时(秒)，读取超时为两次收到数据之间的最长间隔
+connect_timeout = 10
+read_timeout = 30
+
+# 连接池大小，与并行下载的最大数量相同
+pool_size = 8
+
+# 重试次数和退避系数，第n次重试前等待 backoff_factor * 2^(n-1) 秒
+retries = 3
+backoff_factor = 0.5
+# 需要重试的服务器错误
+retry_status = [500, 502, 503, 504]
+
+# 剩余请求次数不超过该值时推迟请求，保留给用户主动发起的请求
+rate_limit_reserve = 5
+# 推迟请求的最长等待时间(秒)，超过时抛出 RateLimited
+max_defer = 30
+
+# 共享会话
+_session = None
+_lock = threading.Lock()
+
+# 主机 -> (剩余请求次数, 次数重置时间)
+_budgets = {}
+
+
+class RateLimited(requests.exceptions.RequestException):
+    # 请求次数已用完，在重置时间之前无法请求
+
+    def __init__(self, host: str, reset: float):
+        super().__init__("{0} 请求次数已用完，将在{1}后重置".format(
+            host, time.strftime("%H:%M:%S", time.localtime(reset))))
+        self.reset = reset
+
+
+def createSession(size: int = pool_size) -> requests.Session:
+    # 建立带连接池和重试的会话，同一主机的连接被复用
+    retry = Retry(total=retries,
+                  connect=retries,
+                  read=retries,
+                  status=retries,
+                  backoff_factor=backoff_factor,
+                  status_forcelist=retry_status,
+                  allowed_methods=['GET', 'HEAD'],
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def sharedSession() -> requests.Session:
+    # 所有线程共用的会话
+    global _session
+    with _lock:
+        if _session is None:
+            _session = createSession()
+        return _session
+
+
+def waitTime(url: str) -> float:
+    # 请求前需要等待的时间(秒)，剩余请求次数充足时为0
+    host = urlsplit(url).netloc
+    with _lock:
+        budget = _budgets.get(host)
+    if budget is None:
+        return 0
+    remaining, reset = budget
+    now = time.time()
+    if reset <= now:
+        with _lock:
+            _budgets.pop(host, None)
+        return 0
+    if remaining > rate_limit_reserve:
+        return 0
+    return reset - now
+
+
+def record(url: str, r: requests.Response) -> None:
+    # 记录响应中请求地址所在主机的剩余请求次数
+    host = urlsplit(url).netloc
+    remaining = r.headers.get('X-RateLimit-Remaining')
+    reset = r.headers.get('X-RateLimit-Reset')
+    retry_after = r.headers.get('Retry-After')
+    try:
+        if r.status_code in [403, 429] and retry_after is not None:
+            budget = (0, time.time() + float(retry_after))
+        elif remaining is not None and reset is not None:
+            budget = (int(remaining), float(reset))
+        else:
+            return
+    except ValueError:
+        return
+    with _lock:
+        _budgets[host] = budget
+
+
+def get(url: str, params: dict = None, headers: dict = None, stream: bool = False,
+        session: requests.Session = None) -> requests.Response:
+    # 发送GET请求，请求次数即将用完时等待至重置时间，等待时间过长时抛出 RateLimited
+    delay = waitTime(url)
+    if delay > 0:
+        if delay > max_defer:
+            raise RateLimited(urlsplit(url).netloc, time.time() + delay)
+        time.sleep(delay)
+
+    r = (session or sharedSession()).get(url, params=params, headers=headers, stream=stream,
+                                         timeout=(connect_timeout, read_timeout))
+    record(url, r)
+    return r
@@ -0,0 +1,132 @@
+from collections import deque
+
+
+class Automaton:
+    # 多关键词匹配自动机(Aho-Corasick)，在一次从左到右的扫描中找出所有关键词，重叠时最长匹配优先
+
+    def __init__(self, keywords) -> None:
+
+        # 转移表: 每个状态为 字符 -> 下一个状态 的字典
+        self.goto = [{}]
+        # 失配指针
+        self.fail = [0]
+        # 每个状态可匹配到的最长关键词长度(包括沿失配指针可达的输出)
+        self.output = [0]
+
+        # 建立关键词前缀树，忽略空关键词
+        for keyword in keywords:
+            if keyword == "":
+                continue
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(0)
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state] = len(keyword)
+
+        # 广度优先计算失配指针
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] = max(self.output[next_state], self.output[self.fail[next_state]])
+
+    def __bool__(self) -> bool:
+        return len(self.goto[0]) > 0
+
+    def matches(self, text: str):
+        # 按位置顺序返回互不重叠的 (起始位置, 结束位置)，起始位置最靠左者优先，同起点时最长者优先
+
+        # 每个起始位置上的最长匹配长度
+        longest = {}
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+
+            # 沿失配链收集所有以当前位置结尾的关键词
+            match_state = state
+            while match_state and self.output[match_state]:
+                length = self.output[match_state]
+                start = index - length + 1
+                if longest.get(start, 0) < length:
+                    longest[start] = length
+                match_state = self.fail[match_state]
+
+        # 从左到右选出不重叠的匹配
+        end = 0
+        for start in sorted(longest):
+            if start < end:
+                continue
+            end = start + longest[start]
+            yield start, end
+
+
+def replaceAll(context: str, replacements: dict) -> str:
+    # 在一次扫描中替换所有关键词，替换后的内容不会被再次替换，结果与字典顺序无关
+
+    automaton = Automaton(replacements.keys())
+    if not automaton:
+        return context
+
+    pieces = []
+    position = 0
+    for start, end in automaton.matches(context):
+        pieces.append(context[position:start])
+        pieces.append(replacements[context[start:end]])
+        position = end
+    pieces.append(context[position:])
+
+    return "".join(pieces)
+
+
+class CompiledTemplate:
+    # 预编译的模板：按模板关键词切分为文本片段和关键词槽位，渲染时只需填充槽位并拼接
+
+    def __init__(self, content: str, keywords) -> None:
+
+        # 原始模板内容
+        self.content = content
+        # 模板关键词集合
+        self.keywords = set(keyword for keyword in keywords if keyword != "")
+        # 文本片段，比槽位多一个
+        self.literals = []
+        # 关键词槽位
+        self.slots = []
+
+        position = 0
+        for start, end in Automaton(self.keywords).matches(content):
+            self.literals.append(content[position:start])
+            self.slots.append(content[start:end])
+            position = end
+        self.literals.append(content[position:])
+
+    def render(self, replacements: dict) -> str:
+
+        # 含有模板关键词以外的自定义关键词时需要重新扫描整个模板
+        # 未替换的模板关键词原样保留，以保证与槽位切分时的最长匹配结果一致
+        for keyword in replacements.keys():
+            if keyword not in self.keywords and keyword != "":
+                merged = dict((slot, slot) for slot in self.keywords)
+                merged.update(replacements)
+                return replaceAll(self.content, merged)
+
+        pieces = [self.literals[0]]
+        for index, slot in enumerate(self.slots):
+            pieces.append(replacements.get(slot, slot))
+            pieces.append(self.literals[index + 1])
+
+        return "".join(pieces)
+
+
+def compileTemplate(template: dict) -> CompiledTemplate:
+    return CompiledTemplate(template.get('content'), template.get('rolename'))
@@ -5,9 +5,45 @@ import time
 import requests
 from PySide2.QtWidgets import QMessageBox, QMainWindow
 
+import FDDownload
+import FDEndpoints
+import FDHttpCache
+import FDTemplate
+
+# 程序运行必需的依赖文件，启动时检查一次，缺少任一文件时进入恢复模式
+required_files = ['MainForm.ui', 'FormMenu.ui', 'FormCustom.ui', 'FormUpdate.ui', 'FormDebug.ui',
+                  'FormConflicts.ui', 'icon.png']
+
+# 本次运行是否已经进行过恢复，各窗口载入失败时不重复恢复
+_rescued = False
+
+
+def missingFiles() -> list:
+    # 缺少的必需依赖文件
+    return [name for name in required_files if not os.path.exists("ui\\{}".format(name))]
+
+
+def checkFiles():
+    # 启动时检查所有窗口的依赖文件，缺少时进入恢复模式
+    if len(missingFiles()) > 0:
+        rescueMode()
+
+
+def writeFile(name: str, content: bytes) -> None:
+    # 先写入临时文件再替换，避免写入中断留下不完整的依赖文件
+    path = "ui\\{}".format(name)
+    with open(path + ".part", "wb") as f:
+        f.write(content)
+    os.replace(path + ".part", path)
+
 
 def rescueMode():
-    # 缺少必要文件的恢复模式
+    # 缺少必要文件的恢复模式，一次下载所有缺少的依赖文件
+    global _rescued
+    if _rescued:
+        return
+    _rescued = True
+
     QMessageBox.critical(QMainWindow(), "致命错误",
                          "读取依赖文件失败，该文件可能不存在或已损坏，程序无法运行\n即将进入恢复模式")
 
@@ -16,49 +52,64 @@ def rescueMode():
 
         # 获取依赖文件列表
         try:
-            r = requests.get(url='https://api.github.com/repos/Pitrick3141/DontFDHere/contents/ui',
-                             params={'ref': 'master'})
+            r = FDHttpCache.get(url=FDEndpoints.contentsUrl("ui"), params={'ref': FDEndpoints.branch})
         except requests.exceptions.ConnectionError:
             QMessageBox.critical(QMainWindow(), "恢复模式", "网络连接异常，依赖文件列表获取失败")
             sys.exit(1)
+        except requests.exceptions.RequestException as e:
+            QMessageBox.critical(QMainWindow(), "恢复模式", "依赖文件列表获取失败: {0}".format(e))
+            sys.exit(1)
+        if not r.ok:
+            QMessageBox.critical(QMainWindow(), "恢复模式", "依赖文件列表获取失败: HTTP {0}".format(r.status_code))
+            sys.exit(1)
+
+        # 云端依赖文件列表，只下载文件，镜像或代理返回的错误页面等格式有误的列表视为获取失败
+        try:
+            remote_files = [file for file in r.json() if file['type'] == 'file']
+            for file in remote_files:
+                if not isinstance(file['name'], str) or not isinstance(file['path'], str) \
+                        or not isinstance(file['sha'], str) or not isinstance(file['size'], int) \
+                        or not os.path.basename(file['name']) == file['name']:
+                    raise ValueError(file.get('name'))
+        except (ValueError, KeyError, TypeError, AttributeError):
+            QMessageBox.critical(QMainWindow(), "恢复模式", "依赖文件列表获取失败: 依赖文件列表格式有误")
+            sys.exit(1)
 
         # 创建依赖文件目录
         if not os.path.exists("ui"):
             os.mkdir("ui")
 
-        # 依赖文件列表
-        required_files = r.json()
+        # 本地不存在的依赖文件
+        files = dict((file['name'], file) for file in remote_files
+                     if not os.path.exists("ui\\{}".format(file['name'])))
 
         # 已下载文件列表
         downloaded_files = []
+        # 下载失败的文件列表
+        failed_files = []
 
         # 生成恢复模式报告
         rescue_report = "恢复模式报告\n------\n"
         rescue_report += "开始恢复时间: {}\n".format(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()))
 
-        # 下载依赖文件
-        for file in required_files:
-
-            download_url = file['download_url']
-            name = file['name']
-            file_hash = file['sha']
-            file_size = file['size']
+        # 并行下载依赖文件，校验blob hash后写入
+        for name, content, error in FDDownload.downloadAll([(name, FDEndpoints.rawUrl(file['path']))
+                                                            for name, file in files.items()]):
+            file_hash = files[name]['sha']
+            file_size = files[name]['size']
             str_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
 
-            # 若文件存在则跳过下载
-            if os.path.exists("ui\\{}".format(name)):
+            if error is None and not FDTemplate.blobHash(content) == file_hash:
+                error = "文件哈希与云端不一致"
+            if error is None:
+                try:
+                    writeFile(name, content)
+                except OSError as e:
+                    error = str(e)
+            if error is not None:
+                failed_files.append("{} 依赖文件下载失败: ui\\{}\n{}\n".format(str_time, name, error))
                 continue
 
-            try:
-                download = requests.get(url=download_url)
-            except requests.exceptions.ConnectionError:
-                QMessageBox.critical(QMainWindow(), "恢复模式", "网络连接异常，依赖文件下载失败")
-                sys.exit(1)
-
-            # 写入依赖文件
-            with open("ui\\{}".format(name), "wb") as f:
-                f.write(download.content)
-
             downloaded_files.append(
                 "{} 已下载依赖文件: ui\\{}\n文件大小: {}Bytes ({}MB)\n文件哈希: {}\n".format(
                     str_time,
@@ -68,7 +119,7 @@ def rescueMode():
                     file_hash))
 
         # 弹窗显示恢复模式报告并写入恢复模式报告文件
-        for file in downloaded_files:
+        for file in downloaded_files + failed_files:
             rescue_report += file
         rescue_report += "------\n提示：恢复模式会自动下载最新版本依赖文件，若依赖文件与当前版本冲突程序可能无法正常运行，" \
                          "请前往https://github.com/Pitrick3141/DontFDHere/releases/latest下载最新版本\n"
@@ -76,8 +127,15 @@ def rescueMode():
         with open("恢复报告_{}.txt".format(time.strftime("%Y_%m_%d_%H_%M_%S", time.localtime())), "w") as f:
             f.write(rescue_report)
 
-        # 弹窗提示重启并退出程序
-        QMessageBox.information(QMainWindow(), "恢复模式", "所有依赖文件下载完成")
+        # 仍缺少必需的依赖文件时无法运行
+        if len(missingFiles()) > 0:
+            QMessageBox.critical(QMainWindow(), "恢复模式", "部分依赖文件下载失败，程序无法运行")
+            sys.exit(1)
+
+        if len(failed_files) > 0:
+            QMessageBox.warning(QMainWindow(), "恢复模式", "必需的依赖文件已下载完成，部分可选文件下载失败")
+        else:
+            QMessageBox.information(QMainWindow(), "恢复模式", "所有依赖文件下载完成")
         return
 
     else:
@@ -0,0 +1,165 @@
+import heapq
+import math
+import operator
+
+global searchIndex
+
+# 模板名称中包含搜索内容时的额外得分
+name_bonus = 10.0
+# BM25 参数
+bm25_k = 1.2
+bm25_b = 0.75
+
+
+def tokenize(text: str) -> set:
+    # 将文本切分为相邻两字(bigram)，中文没有空格分词，使用字符bigram
+    # 空白字符作为分隔，不跨空白组成bigram，单字的词也作为检索词
+    terms = set()
+    for run in text.lower().split():
+        if len(run) == 1:
+            terms.add(run)
+        else:
+            terms.update(map(operator.add, run, run[1:]))
+    return terms
+
+
+def indexTerms(text: str) -> set:
+    # 模板内容的索引词: 所有bigram及单字，单字查询直接使用单字的倒排表，无需遍历所有词
+    terms = tokenize(text)
+    for run in text.lower().split():
+        terms.update(run)
+    return terms
+
+
+def queryTerms(query: str) -> list:
+    # 搜索内容的检索词，与索引相同的切分方式，单字查询的检索词即该字
+    return list(tokenize(query))
+
+
+class SearchIndex:
+    # 模板内容的倒排索引，每个词对应包含该词的文档编号列表
+
+    def __init__(self):
+        # 词 -> 文档编号列表(递增)
+        self.postings = {}
+        # 文档编号 -> (模板hash, 模板名称, 内容长度, 小写的模板名称)
+        self.docs = {}
+        # 模板hash -> 文档编号
+        self.ids = {}
+        # 下一个文档编号
+        self.next_id = 0
+        # 已删除但仍在倒排表中的文档数量
+        self.deleted = 0
+        # 所有文档的内容总长度
+        self.total_length = 0
+
+    def add(self, template_hash: str, name: str, content: str) -> None:
+        if template_hash in self.ids:
+            self.remove(template_hash)
+
+        doc_id = self.next_id
+        self.next_id += 1
+        self.ids[template_hash] = doc_id
+        self.docs[doc_id] = (template_hash, name, len(content), name.lower())
+        self.total_length += len(content)
+
+        postings = self.postings
+        for term in indexTerms(name + "\n" + content):
+            posting = postings.get(term)
+            if posting is None:
+                postings[term] = [doc_id]
+            else:
+                posting.append(doc_id)
+
+    def remove(self, template_hash: str) -> None:
+        # 只标记删除，已删除的文档在搜索时跳过，过多时再整理倒排表
+        doc_id = self.ids.pop(template_hash, None)
+        if doc_id is None:
+            return
+        self.total_length -= self.docs.pop(doc_id)[2]
+        self.deleted += 1
+        if self.deleted > 1000 and self.deleted > len(self.docs):
+            self.compact()
+
+    def compact(self) -> None:
+        docs = self.docs
+        for term in list(self.postings.keys()):
+            posting = [doc_id for doc_id in self.postings[term] if doc_id in docs]
+            if posting:
+                self.postings[term] = posting
+            else:
+                del self.postings[term]
+        self.deleted = 0
+
+    def clear(self) -> None:
+        self.postings.clear()
+        self.docs.clear()
+        self.ids.clear()
+        self.deleted = 0
+        self.total_length = 0
+
+    def search(self, query: str, limit: int = 20) -> list:
+        # 返回包含所有检索词的模板，按得分从高到低排序: [(模板hash, 模板名称, 得分)]
+
+        query = query.strip()
+        if query == "" or len(self.docs) == 0:
+            return []
+
+        # 检索词的倒排表，跳过已删除但尚未整理的文档，使文档频率只计算现有的模板
+        docs = self.docs
+        postings = []
+        for term in queryTerms(query):
+            posting = [doc_id for doc_id in self.postings.get(term, []) if doc_id in docs]
+            if len(posting) == 0:
+                return []
+            postings.append(posting)
+
+        # 从出现文档最少的检索词开始求交集
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if len(candidates) == 0:
+                return []
+        total = len(self.docs)
+        weights = [math.log(1 + total / len(posting)) for posting in postings]
+
+        # BM25 评分(不记录词频)：内容越短、检索词越稀有得分越高，模板名称包含搜索内容时额外加分
+        numerator = sum(weights) * (bm25_k + 1)
+        constant = 1 + bm25_k * (1 - bm25_b)
+        factor = bm25_k * bm25_b / max(self.total_length / len(docs), 1)
+        lowered = query.lower()
+
+        def score(doc_id):
+            doc = docs.get(doc_id)
+            if doc is None:
+                return -1.0
+            return numerator / (constant + factor * doc[2]) + (name_bonus if lowered in doc[3] else 0.0)
+
+        results = []
+        for doc_id in heapq.nlargest(limit, candidates, key=score):
+            if doc_id in docs:
+                doc = docs[doc_id]
+                results.append((doc[0], doc[1], score(doc_id)))
+        return results
+
+
+def init():
+    global searchIndex
+    searchIndex = SearchIndex()
+
+
+def add(template_hash: str, name: str, content: str) -> None:
+    searchIndex.add(template_hash, name, content)
+
+
+def remove(template_hash: str) -> None:
+    searchIndex.remove(template_hash)
+
+
+def clear() -> None:
+    searchIndex.clear()
+
+
+def search(query: str, limit: int = 20) -> list:
+    return searchIndex.search(query, limit)
@@ -0,0 +1,301 @@
+import json
+import os
+import sqlite3
+import time
+
+import FDTemplate
+
+# 模板数据库: 所有模板保存在一个SQLite数据库文件中，替代模板文件目录
+# 数据库文件存在时使用数据库存储模板，模板文件目录可以导入到数据库或从数据库导出
+
+# 模板数据库文件
+store_path = "FDTemplates.db"
+
+# 数据库格式版本
+store_version = 1
+
+# 导出模板文件时文件名中不能使用的字符
+invalid_chars = '\\/:*?"<>|'
+
+_schema = """
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    content TEXT NOT NULL,
+    rolename TEXT NOT NULL,
+    roledes TEXT NOT NULL,
+    extra TEXT,
+    sha TEXT NOT NULL,
+    created REAL NOT NULL,
+    modified REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS templates_sha ON templates (sha);
+CREATE TABLE IF NOT EXISTS configs (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# 模板内容全文索引，中文没有空格分词，使用三字(trigram)分词
+_fts_schema = """
+CREATE VIRTUAL TABLE IF NOT EXISTS templates_fts USING fts5 (
+    name, content, content='templates', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS templates_ai AFTER INSERT ON templates BEGIN
+    INSERT INTO templates_fts (rowid, name, content) VALUES (new.id, new.name, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS templates_ad AFTER DELETE ON templates BEGIN
+    INSERT INTO templates_fts (templates_fts, rowid, name, content) VALUES ('delete', old.id, old.name, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS templates_au AFTER UPDATE ON templates BEGIN
+    INSERT INTO templates_fts (templates_fts, rowid, name, content) VALUES ('delete', old.id, old.name, old.content);
+    INSERT INTO templates_fts (rowid, name, content) VALUES (new.id, new.name, new.content);
+END;
+"""
+
+# 界面线程使用的数据库连接
+_opened = None
+
+
+class Store:
+    # SQLite模板数据库，每个线程使用各自的连接
+
+    def __init__(self, path: str = store_path):
+        self.path = path
+        try:
+            self.conn = sqlite3.connect(path)
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version > store_version:
+                self.conn.close()
+                raise FDTemplate.TemplateError("不支持的模板数据库版本")
+            with self.conn:
+                self.conn.executescript(_schema)
+                self.conn.execute("PRAGMA user_version = {0}".format(store_version))
+        except sqlite3.DatabaseError as e:
+            raise FDTemplate.TemplateError("模板数据库已损坏: {0}".format(e))
+
+        # SQLite未编译FTS5或不支持trigram分词时不建立全文索引
+        try:
+            with self.conn:
+                self.conn.executescript(_fts_schema)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM templates").fetchone()[0]
+
+    def configs(self) -> list:
+        # 所有配置文件字典
+        return [json.loads(data) for data, in self.conn.execute("SELECT data FROM configs ORDER BY name")]
+
+    def templates(self, lazy: bool = False):
+        # 逐个返回 (模板编号, hash, 模板字典)，懒加载模式下不读取模板内容
+        columns = "id, sha, name, rolename, roledes, extra" + ("" if lazy else ", content")
+        for row in self.conn.execute("SELECT {0} FROM templates ORDER BY id".format(columns)):
+            data = json.loads(row[5]) if row[5] else {}
+            data['name'] = row[2]
+            data['rolename'] = json.loads(row[3])
+            data['roledes'] = json.loads(row[4])
+            if not lazy:
+                data['content'] = row[6]
+            data['store_id'] = row[0]
+            yield row[0], row[1], data
+
+    def content(self, template_id: int) -> str:
+        row = self.conn.execute("SELECT content FROM templates WHERE id = ?", (template_id,)).fetchone()
+        if row is None:
+            raise FDTemplate.TemplateError("模板已从模板数据库中删除")
+        return row[0]
+
+    def exists(self, name: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM templates WHERE name = ?", (name,)).fetchone() is not None
+
+    def findHash(self, sha: str):
+        # 按hash查找模板名称，不存在时返回None
+        row = self.conn.execute("SELECT name FROM templates WHERE sha = ?", (sha,)).fetchone()
+        return None if row is None else row[0]
+
+    def putTemplate(self, data: dict, sha: str) -> None:
+        # 保存模板，同名模板将被覆盖，需要在事务中调用
+        extra = dict((key, value) for key, value in data.items()
+                     if key not in ['name', 'content', 'rolename', 'roledes', 'hash', 'path',
+                                    'store_id', 'bundle_index'])
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO templates (name, content, rolename, roledes, extra, sha, created, modified) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET content = excluded.content, rolename = excluded.rolename, "
+            "roledes = excluded.roledes, extra = excluded.extra, sha = excluded.sha, modified = excluded.modified",
+            (data.get('name'),
+             data.get('content'),
+             json.dumps(data.get('rolename'), ensure_ascii=False),
+             json.dumps(data.get('roledes'), ensure_ascii=False),
+             json.dumps(extra, ensure_ascii=False) if extra else None,
+             sha,
+             now,
+             now))
+
+    def saveTemplate(self, data: dict, sha: str) -> None:
+        # 在单独的事务中保存一个模板
+        FDTemplate.checkTemplate(data)
+        with self.conn:
+            self.putTemplate(data, sha)
+
+    def saveFile(self, raw: bytes, name: str = None) -> None:
+        # 保存模板文件内容，hash与模板文件相同，name 不为空时以该名称保存
+        data = FDTemplate.parseTemplate(raw)
+        if FDTemplate.isConfig(data):
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO configs (name, data) VALUES (?, ?)",
+                                  (name, json.dumps(data, ensure_ascii=False)))
+            return
+        if name is not None:
+            data['name'] = name
+        self.saveTemplate(data, FDTemplate.blobHash(raw))
+
+    def saveFiles(self, items) -> (int, list):
+        # 在一个事务中保存 [(保存名称, 模板文件内容)]，返回 (成功保存的数量, [(保存名称, 错误)])
+        parsed = []
+        errors = []
+        for name, raw in items:
+            try:
+                data = FDTemplate.parseTemplate(raw)
+                if not FDTemplate.isConfig(data):
+                    data['name'] = name
+                    FDTemplate.checkTemplate(data)
+            except FDTemplate.TemplateError as e:
+                errors.append((name, str(e)))
+                continue
+            parsed.append((name, data, FDTemplate.blobHash(raw)))
+
+        with self.conn:
+            for name, data, sha in parsed:
+                if FDTemplate.isConfig(data):
+                    self.conn.execute("INSERT OR REPLACE INTO configs (name, data) VALUES (?, ?)",
+                                      (name, json.dumps(data, ensure_ascii=False)))
+                else:
+                    self.putTemplate(data, sha)
+        return len(parsed), errors
+
+    def modified(self, template_id: int):
+        # 模板的修改时间，模板不存在时返回None
+        row = self.conn.execute("SELECT modified FROM templates WHERE id = ?", (template_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def index(self):
+        # 逐个返回 (hash, 模板名称, 修改时间)，不读取模板内容
+        return self.conn.execute("SELECT sha, name, modified FROM templates ORDER BY id")
+
+    def search(self, query: str, limit: int = 20) -> list:
+        # 全文搜索模板内容: [(hash, 模板名称, 得分)]，三字以下的搜索内容使用子串匹配
+        query = query.strip()
+        if query == "":
+            return []
+        if self.fts and len(query) >= 3:
+            rows = self.conn.execute(
+                "SELECT templates.sha, templates.name, -bm25(templates_fts) FROM templates_fts "
+                "JOIN templates ON templates.id = templates_fts.rowid "
+                "WHERE templates_fts MATCH ? ORDER BY bm25(templates_fts) LIMIT ?",
+                ('"{0}"'.format(query.replace('"', '""')), limit))
+        else:
+            pattern = "%{0}%".format(query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+            rows = self.conn.execute(
+                "SELECT sha, name, 0 FROM templates WHERE name LIKE ? ESCAPE '\\' OR content LIKE ? ESCAPE '\\' "
+                "ORDER BY length(content) LIMIT ?",
+                (pattern, pattern, limit))
+        return [(sha, name, score) for sha, name, score in rows]
+
+    def importDirectory(self, template_dir: str = FDTemplate.template_dir) -> (int, list):
+        # 在一个事务中导入模板文件目录中的所有模板文件，返回 (导入数量, [(文件路径, 错误)])
+        # 数据库中模板名称唯一，与本次已导入的模板同名的模板文件不导入，作为错误返回
+        cnt = 0
+        errors = []
+        # 模板名称 -> 本次导入的模板文件路径
+        imported = {}
+        with self.conn:
+            for path, dir_list, file_list in os.walk(template_dir):
+                for file_name in file_list:
+                    if not file_name.endswith(".json"):
+                        continue
+                    file_path = os.path.join(path, file_name)
+                    try:
+                        hash_value, data = FDTemplate.readTemplate(file_path)
+                        if FDTemplate.isConfig(data):
+                            self.conn.execute("INSERT OR REPLACE INTO configs (name, data) VALUES (?, ?)",
+                                              (file_name[:-len(".json")], json.dumps(data, ensure_ascii=False)))
+                            continue
+                        FDTemplate.checkTemplate(data)
+                    except (FDTemplate.TemplateError, OSError) as e:
+                        errors.append((file_path, str(e)))
+                        continue
+                    if data.get('name') in imported:
+                        errors.append((file_path, "与模板文件{0}中的模板同名，未导入".format(
+                            imported[data.get('name')])))
+                        continue
+                    imported[data.get('name')] = file_path
+                    self.putTemplate(data, hash_value)
+                    cnt += 1
+        return cnt, errors
+
+    def exportDirectory(self, template_dir: str = FDTemplate.template_dir) -> int:
+        # 将所有模板导出为模板文件，返回导出数量
+        if not os.path.exists(template_dir):
+            os.mkdir(template_dir)
+        # 本次导出的文件名(小写)，Windows的文件名不区分大小写
+        exported = set()
+        for name, data in self.conn.execute("SELECT name, data FROM configs"):
+            file_name = exportName(name, None, exported)
+            with open(os.path.join(template_dir, file_name), 'w', encoding='utf-8') as f:
+                f.write(data)
+        cnt = 0
+        for template_id, sha, data in self.templates():
+            json_dump = {'Name': data.pop('name'), 'Content': data.pop('content'),
+                         'Rolename': data.pop('rolename'), 'RoleDes': data.pop('roledes')}
+            data.pop('store_id')
+            json_dump.update(data)
+            file_name = exportName(json_dump['Name'], sha, exported)
+            # 与原模板文件格式相同(ASCII转义、键的顺序)，导出的文件hash与导入时相同
+            with open(os.path.join(template_dir, file_name), 'w', encoding='utf-8') as f:
+                json.dump(json_dump, f)
+            cnt += 1
+        return cnt
+
+
+def fileName(name: str) -> str:
+    # 模板名称对应的文件名(不含拓展名)，替换文件名中不能使用的字符
+    name = "".join("_" if char in invalid_chars or ord(char) < 32 else char for char in name)
+    name = name.strip().rstrip(".")
+    return name if name else "_"
+
+
+def exportName(name: str, sha, exported: set) -> str:
+    # 导出的文件名，替换字符后与本次已导出的文件重名时加上模板hash，避免覆盖先前导出的模板
+    file_name = fileName(name) + ".json"
+    if file_name.lower() in exported:
+        file_name = "{0}_{1}.json".format(fileName(name), (sha or str(len(exported)))[:8])
+    while file_name.lower() in exported:
+        file_name = "{0}_{1}.json".format(file_name[:-len(".json")], len(exported))
+    exported.add(file_name.lower())
+    return file_name
+
+
+def isEnabled() -> bool:
+    # 模板数据库文件存在时使用数据库存储模板
+    return os.path.isfile(store_path)
+
+
+def openStore() -> Store:
+    # 界面线程使用的数据库连接，后台线程需要建立自己的连接
+    global _opened
+    if _opened is None:
+        _opened = Store()
+    return _opened
+
+
+def readContent(template_id: int) -> str:
+    # 懒加载模式下按需读取模板内容
+    return openStore().content(template_id)
@@ -0,0 +1,257 @@
+import datetime
+import os
+import sqlite3
+import zipfile
+
+import requests
+
+import FDDownload
+import FDEndpoints
+import FDHttpCache
+import FDTemplate
+
+# 增量同步: 一次请求获取云端完整文件树及每个文件的blob hash，与本地模板比对后
+# 从一个压缩包(或本地镜像目录)中取出改动的模板文件，校验hash后原样写入
+
+# 云端模板文件目录
+template_prefix = "FDTemplates/"
+
+# 同步冲突(云端模板与本地模板同名但内容不同)的处理方式:
+#   ask 汇总后由用户逐个选择, overwrite 覆盖下载, rename 重命名下载, skip 不下载,
+#   newest 云端最近一次改动该模板文件的提交晚于本地模板的修改时间时覆盖下载，否则不下载
+sync_policies = ['ask', 'overwrite', 'rename', 'skip', 'newest']
+default_policy = 'ask'
+
+# 重命名下载时添加的后缀
+rename_suffix = "_云端同步"
+
+# 下载的压缩包，中断后保留 .part 文件用于断点续传
+archive_path = "FDSync.zip"
+
+
+class SyncError(Exception):
+    # 同步失败
+    pass
+
+
+class SyncCancelled(Exception):
+    # 同步被取消，已下载的部分保留用于断点续传
+    pass
+
+
+def remoteContents() -> (list, bool):
+    # 获取云端模板目录列表，返回 (模板列表, 是否使用了过期的缓存)
+    # 下载地址按配置的端点生成，不使用列表中的 download_url
+    r = FDHttpCache.get(url=FDEndpoints.contentsUrl(template_prefix.rstrip("/")), params={'ref': FDEndpoints.branch})
+    if not r.ok:
+        raise SyncError("获取模板列表失败: HTTP {0}".format(r.status_code))
+    listing = r.json()
+    for template in listing:
+        template['download_url'] = FDEndpoints.rawUrl(template['path'])
+    return listing, r.stale
+
+
+def fileTime(path: str):
+    # 云端最近一次改动该文件的提交时间，文件树中没有单个文件的修改时间，不在提交历史中时返回None
+    r = FDHttpCache.get(url=FDEndpoints.commitsUrl(),
+                        params={'path': path, 'sha': FDEndpoints.branch, 'per_page': 1})
+    if not r.ok:
+        raise SyncError("获取云端提交信息失败: HTTP {0}".format(r.status_code))
+    try:
+        commits = r.json()
+        if len(commits) == 0:
+            return None
+        date = commits[0]['commit']['committer']['date']
+        return datetime.datetime.strptime(date, "%Y-%m-%dT%H:%M:%SZ").replace(
+            tzinfo=datetime.timezone.utc).timestamp()
+    except (KeyError, IndexError, TypeError, ValueError):
+        raise SyncError("云端提交信息格式有误")
+
+
+def fileTimes(templates: list, progress=None) -> (dict, str):
+    # 逐个获取云端模板的修改时间，返回 ({文件路径: 时间}, 停止获取的原因，全部获取时为None)
+    # 提交历史中没有单个文件改动的汇总，每个模板一次请求(带缓存，未改变时服务器返回304)，只需获取同名但内容不同的模板
+    # 获取失败的模板没有修改时间，由调用方报告; 请求次数用完或网络异常时不再获取其余模板
+    # progress(已获取数量, 总数量) 返回False时停止获取
+    times = {}
+    for cnt, template in enumerate(templates, 1):
+        try:
+            remote_time = fileTime(template['path'])
+            if remote_time is not None:
+                times[template['path']] = remote_time
+        except SyncError:
+            pass
+        except requests.exceptions.RequestException as e:
+            return times, str(e)
+        if progress is not None and not progress(cnt, len(templates)):
+            break
+    return times, None
+
+
+def classify(listing: list, local_hashes, local_names) -> (list, list, list):
+    # 将云端模板分为 (本地不存在的, 同名但内容不同的, 已是最新的)
+    new_templates = []
+    changed_templates = []
+    existed_templates = []
+    for template in listing:
+        name = template['name'].replace('.json', '')
+        if name not in local_names:
+            new_templates.append(template)
+        elif template['sha'] not in local_hashes:
+            changed_templates.append(template)
+        else:
+            existed_templates.append(template)
+    return new_templates, changed_templates, existed_templates
+
+
+def resolve(policy: str, local_time: float = None, remote_time: float = None) -> str:
+    # 按同步策略决定同名模板的处理方式: overwrite, rename 或 skip
+    if policy == 'newest':
+        # 无法比较修改时间时不下载，由调用方报告
+        if local_time is None or remote_time is None:
+            return 'skip'
+        return 'overwrite' if remote_time >= local_time else 'skip'
+    if policy in ['overwrite', 'rename', 'skip']:
+        return policy
+    raise ValueError("同步策略 {0} 需要用户选择".format(policy))
+
+
+def saveName(name: str, action: str) -> str:
+    # 按处理方式决定保存名称
+    return name + rename_suffix if action == 'rename' else name
+
+
+def remoteTree() -> list:
+    # 获取云端模板列表: [{'name', 'path', 'sha', 'size', 'download_url'}]，与contents API的格式相同
+    r = FDHttpCache.get(url=FDEndpoints.treeUrl(), params={'recursive': '1'})
+    if not r.ok:
+        raise SyncError("获取云端文件树失败: HTTP {0}".format(r.status_code))
+    tree = r.json()
+    if tree.get('truncated'):
+        raise SyncError("云端文件树过大，无法一次获取")
+
+    templates = []
+    for item in tree.get('tree', []):
+        path = item.get('path', "")
+        if not item.get('type') == 'blob' or not path.startswith(template_prefix):
+            continue
+        name = path[len(template_prefix):]
+        if "/" in name or not name.endswith(".json"):
+            continue
+        templates.append({'name': name,
+                          'path': path,
+                          'sha': item.get('sha'),
+                          'size': item.get('size', 0),
+                          'download_url': FDEndpoints.rawUrl(path)})
+    return templates
+
+
+def downloadArchive(path: str = archive_path, session: requests.Session = None, progress=None) -> str:
+    # 下载仓库压缩包，存在未完成的下载时以 Range 请求续传，云端内容已改变时(ETag不同)重新下载
+    # progress(已下载字节数, 总字节数) 返回False时取消下载，总字节数未知时为0
+    try:
+        FDDownload.downloadFile(FDEndpoints.archiveUrl(), path, session=session, progress=progress)
+    except FDDownload.DownloadCancelled:
+        raise SyncCancelled()
+
+    if not zipfile.is_zipfile(path):
+        os.remove(path)
+        raise SyncError("下载的压缩包已损坏")
+    return path
+
+
+def extractFiles(path: str, wanted: dict) -> (dict, list):
+    # 从压缩包中取出 {文件路径: blob hash} 中的文件并校验hash，返回 ({文件路径: 文件内容}, [(文件路径, 错误)])
+    files = {}
+    errors = []
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            # 压缩包中的路径以"仓库名-分支名/"开头
+            parts = info.filename.split("/", 1)
+            if len(parts) < 2 or parts[1] not in wanted:
+                continue
+            data = archive.read(info)
+            if FDTemplate.blobHash(data) == wanted[parts[1]]:
+                files[parts[1]] = data
+            else:
+                errors.append((parts[1], "文件hash与云端文件树不一致"))
+    errors += [(file_path, "压缩包中没有该文件") for file_path in wanted.keys()
+               if file_path not in files and file_path not in dict(errors)]
+    return files, errors
+
+
+def readMirror(mirror_dir: str, wanted: dict) -> (dict, list):
+    # 从本地镜像目录中读取文件并校验hash，返回格式与 extractFiles 相同
+    files = {}
+    errors = []
+    for file_path, sha in wanted.items():
+        try:
+            with open(os.path.join(mirror_dir, *file_path.split("/")), 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            errors.append((file_path, str(e)))
+            continue
+        if FDTemplate.blobHash(data) == sha:
+            files[file_path] = data
+        else:
+            errors.append((file_path, "文件hash与云端文件树不一致"))
+    return files, errors
+
+
+def fetchFiles(wanted: dict, mirror_dir: str = None, session: requests.Session = None, progress=None) -> (dict, list):
+    # 获取 {文件路径: blob hash} 中的文件，优先使用本地镜像目录，其次使用上次已下载完成的压缩包
+    if mirror_dir:
+        return readMirror(mirror_dir, wanted)
+
+    if zipfile.is_zipfile(archive_path):
+        files, errors = extractFiles(archive_path, wanted)
+        if len(errors) == 0:
+            return files, errors
+
+    downloadArchive(archive_path, session, progress)
+    return extractFiles(archive_path, wanted)
+
+
+def removeArchive(path: str = archive_path) -> None:
+    # 同步完成后删除压缩包
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def saveTemplate(name: str, content: bytes, store=None) -> str:
+    # 原样保存同步的模板文件内容，保持与云端相同的hash，返回错误信息，保存成功时返回None
+    # 使用模板数据库时 store 为当前线程的数据库连接
+    if store is not None:
+        try:
+            store.saveFile(content, name)
+        except (FDTemplate.TemplateError, sqlite3.Error) as e:
+            return str(e)
+        return None
+
+    try:
+        FDTemplate.parseTemplate(content)
+        with open(os.path.join(FDTemplate.template_dir, name + ".json"), "wb") as f:
+            f.write(content)
+    except (FDTemplate.TemplateError, OSError) as e:
+        return str(e)
+    return None
+
+
+def saveTemplates(items, store=None) -> (int, list):
+    # 在一次写入中保存 [(保存名称, 文件内容)]，返回 (成功保存的数量, [(保存名称, 错误)])
+    # 使用模板数据库时所有模板在同一个事务中写入
+    if store is not None:
+        try:
+            return store.saveFiles(items)
+        except sqlite3.Error as e:
+            return 0, [(name, str(e)) for name, content in items]
+
+    cnt = 0
+    errors = []
+    for name, content in items:
+        error = saveTemplate(name, content)
+        if error is None:
+            cnt += 1
+        else:
+            errors.append((name, error))
+    return cnt, errors
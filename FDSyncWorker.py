@@ -0,0 +1,156 @@
+import threading
+
+import requests
+from PySide2.QtCore import QThread, Signal
+
+import FDDownload
+import FDStore
+import FDSync
+import FDTemplate
+
+
+class ListWorker(QThread):
+    # 在后台线程中获取云端模板列表
+
+    # 获取完成: (云端模板列表, 是否使用了过期的缓存, 同名但内容不同的模板的云端修改时间 {文件路径: 时间},
+    #           修改时间未全部获取的原因，全部获取或无需获取时为空)
+    listed = Signal(list, bool, dict, str)
+    # 获取失败: 错误信息
+    failed = Signal(str)
+
+    def __init__(self, delta_sync: bool = False, local_hashes: dict = None, parent=None):
+        super().__init__(parent)
+        # 增量同步模式下获取完整文件树
+        self.delta_sync = delta_sync
+        # 按修改时间处理同名模板时的本地模板 {hash: 模板名称}，用于找出需要获取修改时间的模板
+        self.local_hashes = local_hashes
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def run(self) -> None:
+        stale = False
+        remote_times = {}
+        time_error = None
+        try:
+            if self.delta_sync:
+                listing = FDSync.remoteTree()
+            else:
+                listing, stale = FDSync.remoteContents()
+            if self.local_hashes is not None:
+                changed_templates = FDSync.classify(listing,
+                                                    self.local_hashes.keys(),
+                                                    set(self.local_hashes.values()))[1]
+                remote_times, time_error = FDSync.fileTimes(
+                    changed_templates, progress=lambda cnt, total: not self.cancelled.is_set())
+        except requests.exceptions.ConnectionError:
+            self.failed.emit("网络连接异常，同步模板失败")
+            return
+        except requests.exceptions.RequestException as e:
+            self.failed.emit("同步模板失败: {0}".format(e))
+            return
+        except FDSync.SyncError as e:
+            self.failed.emit("同步模板失败: {0}".format(e))
+            return
+        except ValueError:
+            self.failed.emit("云端模板列表格式有误，同步模板失败")
+            return
+
+        self.listed.emit(listing, stale, remote_times, time_error or "")
+
+
+class DownloadWorker(QThread):
+    # 在后台线程中下载并保存选择的模板
+
+    # 下载进度: (已完成数量, 总数量, 当前模板名称)，下载压缩包时为 (已下载字节数, 总字节数, "")
+    progress = Signal(int, int, str)
+    # 已保存一个模板: 模板名称
+    saved = Signal(str)
+    # 下载结束: (成功保存的数量, [(模板名称, 错误)], 是否被取消)
+    downloadFinished = Signal(int, list, bool)
+
+    def __init__(self, downloads: list, delta_sync: bool = False, mirror_dir: str = None, parent=None):
+        super().__init__(parent)
+        # 待下载的模板: [(保存名称, 云端模板信息)]
+        self.downloads = downloads
+        self.delta_sync = delta_sync
+        self.mirror_dir = mirror_dir
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def downloadAll(self) -> (list, list):
+        # 并行下载所有模板，返回 ([(保存名称, 文件内容)], [(保存名称, 错误)])
+        items = []
+        errors = []
+        results = FDDownload.downloadAll([(name, template['download_url']) for name, template in self.downloads])
+        try:
+            for name, content, error in results:
+                if self.cancelled.is_set():
+                    break
+                if error is not None:
+                    errors.append((name, error))
+                else:
+                    items.append((name, content))
+                self.progress.emit(len(items) + len(errors), len(self.downloads), name)
+        finally:
+            results.close()
+        return items, errors
+
+    def fetchAll(self) -> (list, list):
+        # 增量同步: 从一个压缩包或本地镜像目录中取出所有模板
+        def archiveProgress(received, total):
+            self.progress.emit(received, total, "")
+            return not self.cancelled.is_set()
+
+        wanted = dict((template['path'], template['sha']) for name, template in self.downloads)
+        try:
+            files, fetch_errors = FDSync.fetchFiles(wanted, self.mirror_dir, progress=archiveProgress)
+        except FDSync.SyncCancelled:
+            return [], []
+        except (requests.exceptions.RequestException, FDSync.SyncError, OSError) as e:
+            return [], [("模板压缩包", str(e))]
+
+        items = []
+        errors = []
+        fetch_errors = dict(fetch_errors)
+        for name, template in self.downloads:
+            content = files.get(template['path'])
+            if content is None:
+                errors.append((name, fetch_errors.get(template['path'])))
+            else:
+                items.append((name, content))
+        return items, errors
+
+    def run(self) -> None:
+
+        # 使用模板数据库时建立本线程的数据库连接
+        store = None
+        if FDStore.isEnabled():
+            try:
+                store = FDStore.Store()
+            except FDTemplate.TemplateError as e:
+                self.downloadFinished.emit(0, [(FDStore.store_path, str(e))], False)
+                return
+
+        try:
+            items, errors = self.fetchAll() if self.delta_sync else self.downloadAll()
+
+            # 所有下载完成的模板在一次写入中保存，取消时也保存已下载的模板
+            cnt, save_errors = FDSync.saveTemplates(items, store)
+            errors += save_errors
+            failed = set(name for name, error in save_errors)
+            for name, content in items:
+                if name not in failed:
+                    self.saved.emit(name)
+        finally:
+            if store is not None:
+                store.close()
+
+        # 增量同步的所有模板都已保存后不再需要压缩包
+        if self.delta_sync and len(errors) == 0 and not self.cancelled.is_set():
+            FDSync.removeArchive()
+
+        self.downloadFinished.emit(cnt, errors, self.cancelled.is_set())
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+# 不依赖Qt的模板文件读取与校验，供图形界面以外的批量工具使用
+
+# 默认模板文件目录
+template_dir = "FDTemplates"
+
+# 模板文件必需的键
+required_keys = ['name', 'content', 'rolename', 'roledes']
+
+
+class TemplateError(Exception):
+    # 模板文件已损坏或不合法
+    pass
+
+
+def blobHash(data: bytes) -> str:
+    # 计算与git blob相同的SHA-1，用于和云端模板比对
+    hash_obj = hashlib.sha1()
+    hash_obj.update(b"blob %d\0" % len(data))
+    hash_obj.update(data)
+    return hash_obj.hexdigest()
+
+
+def parseTemplate(data: bytes) -> dict:
+    # 将模板文件内容转换为键全部小写的字典
+
+    try:
+        original_data = json.loads(data.decode('utf-8'))
+
+    # 解码失败异常：一般是内容为空或者不合法
+    except json.decoder.JSONDecodeError:
+        raise TemplateError("模板文件内容为空或不合法")
+    except UnicodeDecodeError:
+        raise TemplateError("模板文件编码格式有误")
+
+    if not isinstance(original_data, dict):
+        raise TemplateError("模板文件内容为空或不合法")
+
+    # 将键全部转换为小写，避免大小写混淆
+    parsed = {}
+    for key, value in original_data.items():
+        parsed[key.lower()] = value
+
+    return parsed
+
+
+def isConfig(data: dict) -> bool:
+    # 检测是否是配置文件
+    return 'config' in data.keys()
+
+
+def checkTemplate(data: dict) -> None:
+    # 检测是否有缺失的必需键值对
+    missed_keys = [key for key in required_keys if key not in data.keys()]
+    if not len(missed_keys) == 0:
+        raise TemplateError("缺失如下键值对:{0}".format(missed_keys))
+
+
+def readTemplate(path: str) -> (str, dict):
+    # 读取模板文件，返回 (hash, 模板字典)
+    with open(path, 'rb') as f:
+        data = f.read()
+    return blobHash(data), parseTemplate(data)
+
+
+def readContent(path: str) -> str:
+    # 懒加载模式下按需读取模板内容
+    hash_value, data = readTemplate(path)
+    checkTemplate(data)
+    return data.get('content')
+
+
+def findTemplate(name: str) -> str:
+    # 按路径、文件名或模板名称查找模板文件
+
+    if os.path.isfile(name):
+        return name
+
+    path = os.path.join(template_dir, name + ".json")
+    if os.path.isfile(path):
+        return path
+
+    for dir_path, dir_list, file_list in os.walk(template_dir):
+        for file_name in file_list:
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                hash_value, data = readTemplate(os.path.join(dir_path, file_name))
+            except TemplateError:
+                continue
+            if data.get('name') == name:
+                return os.path.join(dir_path, file_name)
+
+    raise TemplateError("找不到模板: {0}".format(name))
@@ -1,20 +1,117 @@
 import os
 import json
+import threading
+
 import requests
 import webbrowser
 
-from PySide2.QtWidgets import QMessageBox, QPushButton, QDialogButtonBox
+from PySide2.QtCore import Qt, QThread, Signal
+from PySide2.QtWidgets import QMessageBox, QPushButton, QDialogButtonBox, QProgressDialog
 from PySide2.QtUiTools import QUiLoader
 
 import FDDebug
+import FDDownload
+import FDEndpoints
+import FDHttpCache
 import global_var
 import FDRescue
 
 global fdUpdate
 
+# 启动时检查更新的默认间隔(秒)，间隔内使用上次缓存的检查结果，不发送请求
+default_check_interval = 86400
+
+
+def checkInterval() -> float:
+    # 读取配置项中的启动检查更新间隔
+    interval = global_var.get_config('update_check_interval')
+    if not isinstance(interval, (int, float)) or interval < 0:
+        interval = default_check_interval
+    return interval
+
+
+class CheckWorker(QThread):
+    # 在后台线程中获取最新版本信息
+
+    # 获取完成: (最新版本信息, 是否使用了过期的缓存)
+    checked = Signal(dict, bool)
+    # 获取失败: 错误信息
+    failed = Signal(str)
+
+    def __init__(self, ttl: float = None, parent=None):
+        super().__init__(parent)
+        # 缓存有效期，为空时使用配置项中的缓存有效期
+        self.ttl = ttl
+
+    def run(self) -> None:
+        try:
+            r = FDHttpCache.get(url=FDEndpoints.releaseUrl(), ttl=self.ttl)
+        except requests.exceptions.ConnectionError:
+            self.failed.emit("网络连接异常，检查更新失败")
+            return
+        except requests.exceptions.RequestException as e:
+            self.failed.emit("检查更新失败: {0}".format(e))
+            return
+
+        if not r.ok:
+            self.failed.emit("检查更新失败: HTTP {0}".format(r.status_code))
+            return
+        try:
+            json_data = r.json()
+        except ValueError:
+            self.failed.emit("版本信息格式有误，检查更新失败")
+            return
+        self.checked.emit(json_data, r.stale)
+
+
+class UpdateWorker(QThread):
+    # 在后台线程中流式下载更新文件
+
+    # 下载进度: (已下载字节数, 总字节数)
+    progress = Signal(int, int)
+    # 下载结束: (错误信息，下载成功时为空, 是否被取消)
+    downloadFinished = Signal(str, bool)
+
+    def __init__(self, url: str, asset: dict, parent=None):
+        super().__init__(parent)
+        # 下载地址和发布信息中的更新文件
+        self.url = url
+        self.asset = asset
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def report(self, received, total) -> bool:
+        self.progress.emit(received, total)
+        return not self.cancelled.is_set()
+
+    def run(self) -> None:
+        try:
+            FDDownload.downloadFile(self.url,
+                                    self.asset['name'],
+                                    size=self.asset.get('size'),
+                                    digest=self.asset.get('digest'),
+                                    progress=self.report)
+        except FDDownload.DownloadCancelled:
+            self.downloadFinished.emit("", True)
+            return
+        except requests.exceptions.ConnectionError:
+            self.downloadFinished.emit("网络连接异常，下载更新文件失败", False)
+            return
+        except (requests.exceptions.RequestException, FDDownload.DownloadError, OSError) as e:
+            self.downloadFinished.emit("下载更新文件失败: {0}".format(e), False)
+            return
+        self.downloadFinished.emit("", False)
+
 
 class FDUpdate:
 
+    # 后台下载线程
+    download_worker = None
+    # 下载进度窗口
+    download_progress = None
+
     def __init__(self):
 
         # 加载更新弹窗UI
@@ -79,39 +176,88 @@ class FDUpdate:
     def downloadUpdate(self):
 
         # 下载最新版本更新文件
+        asset = self.json_data['assets'][0]
 
-        # 检测是否已经存在更新文件
-        if os.path.exists(self.json_data['assets'][0]['name']):
-            FDDebug.debug("发现已下载的更新文件{},跳过本次下载".format(self.json_data['assets'][0]['name']),
-                          type='warn',
-                          who=self.__class__.__name__)
+        # 正在下载时不重复下载
+        if self.download_worker is not None:
+            FDDebug.debug("更新文件正在下载中", type='warn', who=self.__class__.__name__)
             return
 
-        # 下载更新文件
-        FDDebug.debug("开始下载更新文件{}".format(self.json_data['assets'][0]['browser_download_url']),
-                      who=self.__class__.__name__)
-        try:
-            update_file = requests.get(self.json_data['assets'][0]['browser_download_url'])
-        except requests.exceptions.ConnectionError:
-            FDDebug.debug("网络连接异常，下载更新文件失败", type='error', who=self.__class__.__name__)
+        # 检测是否已经存在完整的更新文件，已损坏的更新文件将被重新下载
+        if os.path.exists(asset['name']):
+            try:
+                FDDownload.verifyFile(asset['name'], asset.get('size'), asset.get('digest'))
+                FDDebug.debug("发现已下载的更新文件{},跳过本次下载".format(asset['name']),
+                              type='warn',
+                              who=self.__class__.__name__)
+                return
+            except (FDDownload.DownloadError, OSError) as e:
+                FDDebug.debug("已下载的更新文件{}校验失败: {}, 重新下载".format(asset['name'], e),
+                              type='warn',
+                              who=self.__class__.__name__)
+                os.remove(asset['name'])
+
+        # 在后台线程中下载更新文件，存在未完成的下载时断点续传
+        url = FDEndpoints.assetUrl(self.json_data['tag_name'], asset['name'])
+        FDDebug.debug("开始下载更新文件{}".format(url), who=self.__class__.__name__)
+        worker = UpdateWorker(url, asset, self.ui)
+        worker.progress.connect(lambda received, total: self.downloadProgress(worker, received, total),
+                                Qt.QueuedConnection)
+        worker.downloadFinished.connect(lambda error, cancelled: self.downloadFinished(worker, error, cancelled),
+                                        Qt.QueuedConnection)
+        self.download_worker = worker
+
+        # 非模态的下载进度窗口，进度以KB显示
+        self.download_progress = QProgressDialog("正在下载更新文件...", "取消下载", 0, 0)
+        self.download_progress.setWindowTitle("下载更新")
+        self.download_progress.setWindowIcon(global_var.app_icon)
+        self.download_progress.setWindowModality(Qt.NonModal)
+        self.download_progress.setAutoClose(False)
+        self.download_progress.setAutoReset(False)
+        self.download_progress.setMinimumDuration(0)
+        self.download_progress.canceled.connect(self.cancelDownload)
+
+        worker.start()
+
+    def cancelDownload(self):
+
+        # 取消下载，已下载的部分保留用于断点续传
+        if self.download_worker is None:
             return
+        FDDebug.debug("正在取消下载更新文件", type='warn', who=self.__class__.__name__)
+        self.download_worker.cancel()
 
-        FDDebug.debug("已下载更新文件".format(self.json_data['assets'][0]['name']),
-                      type='success',
-                      who=self.__class__.__name__)
-        FDDebug.debug("正在保存更新文件到{}\\{}".format(os.getcwd(), self.json_data['assets'][0]['name']),
-                      who=self.__class__.__name__)
+    def downloadProgress(self, worker, received, total):
+        if worker is not self.download_worker or self.download_progress is None:
+            return
+        self.download_progress.setLabelText("正在下载更新文件... {0:.2f} MB / {1:.2f} MB".format(received / 1000000,
+                                                                                           total / 1000000))
+        self.download_progress.setMaximum(total // 1000)
+        self.download_progress.setValue(received // 1000 if total else 0)
+
+    def downloadFinished(self, worker, error, cancelled):
+        if worker is not self.download_worker:
+            return
+        self.download_worker = None
+        if self.download_progress is not None:
+            self.download_progress.close()
+            self.download_progress = None
+
+        asset = self.json_data['assets'][0]
+        if cancelled:
+            FDDebug.debug("已取消下载更新文件，下次下载时将继续", type='warn', who=self.__class__.__name__)
+            return
+        if not error == "":
+            FDDebug.debug(error, type='error', who=self.__class__.__name__)
+            QMessageBox.warning(self.ui, "更新文件下载失败", error)
+            return
 
-        # 保存更新文件到运行目录
-        with open(self.json_data['assets'][0]['name'], 'wb') as f:
-            f.write(update_file.content)
-            f.close()
-        FDDebug.debug("更新文件已保存至{}\\{}".format(os.getcwd(), self.json_data['assets'][0]['name']),
+        FDDebug.debug("更新文件已保存至{}\\{}".format(os.getcwd(), asset['name']),
                       type='success',
                       who=self.__class__.__name__)
         QMessageBox.information(self.ui, "更新文件下载完成", "更新文件已保存至{}\\{}\n{}"
                                 .format(os.getcwd(),
-                                        self.json_data['assets'][0]['name'],
+                                        asset['name'],
                                         "请手动解压并覆盖当前版本"))
 
     def ignoreUpdate(self):
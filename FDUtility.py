@@ -1,12 +1,18 @@
-import hashlib
-import json
 import os
+import sqlite3
 
-import requests
 from PySide2.QtUiTools import QUiLoader
-from PySide2.QtWidgets import QPushButton, QDialogButtonBox, QMessageBox, QFileDialog
+from PySide2.QtCore import Qt
+from PySide2.QtWidgets import QPushButton, QDialogButtonBox, QMessageBox, QFileDialog, QProgressDialog
 
+import FDBundle
+import FDConflicts
+import FDDuplicate
 import FDRescue
+import FDStore
+import FDSync
+import FDSyncWorker
+import FDTemplate
 import global_var
 import FDDebug
 import FDUpdate
@@ -17,6 +23,22 @@ global fdMenu
 
 
 class FDMenu:
+
+    # 后台检查更新线程
+    check_worker = None
+    # 正在进行的检查更新是否需要显示结果(用户主动检查，包括启动检查期间点击检查更新)
+    check_manual = False
+    # 后台同步线程
+    sync_worker = None
+    # 同步下载进度窗口
+    sync_progress = None
+    # 本次同步是否为增量同步
+    delta_sync = False
+    # 本次同步的同名模板处理方式
+    sync_policy = FDSync.default_policy
+    # 同步计数: (云端模板数量, 已是最新的数量, 有变动的数量, 本地不存在的数量)
+    sync_counts = (0, 0, 0, 0)
+
     def __init__(self):
         # 加载菜单UI
         try:
@@ -29,9 +51,6 @@ class FDMenu:
         # 设置窗口图标
         self.ui.setWindowIcon(global_var.app_icon)
 
-        # 是否是启动第一次检查更新
-        self.first_check = True
-
         # 弹窗按钮
         button_close = QPushButton('关闭菜单')
 
@@ -41,26 +60,53 @@ class FDMenu:
         # 绑定按钮事件
         self.ui.buttonOpenTemplateDir.clicked.connect(self.openDir)
         self.ui.buttonImportTemplate.clicked.connect(self.importTemplate)
+        self.ui.buttonExportBundle.clicked.connect(self.exportBundle)
+        self.ui.buttonFindDuplicates.clicked.connect(self.findDuplicates)
+        self.ui.buttonImportStore.clicked.connect(self.importStore)
+        self.ui.buttonExportStore.clicked.connect(self.exportStore)
         self.ui.buttonCustomTemplate.clicked.connect(self.customTemplate)
         self.ui.buttonSyncTemplates.clicked.connect(self.syncTemplates)
-        self.ui.buttonCheckUpdate.clicked.connect(self.checkUpdate)
+        self.ui.buttonCheckUpdate.clicked.connect(lambda: self.checkUpdate())
         self.ui.buttonDebug.clicked.connect(self.showDebug)
 
-    def checkUpdate(self):
+    def checkUpdate(self, startup: bool = False):
 
-        # 检查应用更新
-        latest = True
+        # 在后台线程中检查应用更新，正在检查时不重复检查，用户主动检查时在本次检查完成后显示结果
+        if self.check_worker is not None:
+            if not startup:
+                self.check_manual = True
+            return
+        self.check_manual = not startup
         FDDebug.debug("开始检查更新", who=self.__class__.__name__)
 
-        # 获取Github Repo信息
-        try:
-            r = requests.get(url='https://api.github.com/repos/Pitrick3141/DontFDHere/releases/latest')
-        except requests.exceptions.ConnectionError:
-            FDDebug.debug("网络连接异常，检查更新失败", type='error', who=self.__class__.__name__)
+        # 启动时检查间隔内直接使用上次缓存的检查结果
+        worker = FDUpdate.CheckWorker(FDUpdate.checkInterval() if startup else None, self.ui)
+        worker.checked.connect(lambda json_data, stale: self.updateChecked(worker, json_data, stale),
+                               Qt.QueuedConnection)
+        worker.failed.connect(lambda message: self.checkFailed(worker, message), Qt.QueuedConnection)
+        self.check_worker = worker
+        worker.start()
+
+    def checkFailed(self, worker, message):
+        if worker is not self.check_worker:
+            return
+        self.check_worker = None
+        manual = self.check_manual
+        self.check_manual = False
+        FDDebug.debug(message, type='error', who=self.__class__.__name__)
+        if manual:
+            QMessageBox.warning(self.ui, "检查更新", message)
+
+    def updateChecked(self, worker, json_data, stale):
+        if worker is not self.check_worker:
             return
+        self.check_worker = None
+        manual = self.check_manual
+        self.check_manual = False
 
-        # 反序列化json数据
-        json_data = r.json()
+        latest = True
+        if stale:
+            FDDebug.debug("网络连接异常或处于离线模式，使用缓存的版本信息", type='warn', who=self.__class__.__name__)
         FDDebug.debug("检查更新完成", type='success', who=self.__class__.__name__)
 
         # 最新版本号
@@ -123,119 +169,247 @@ class FDMenu:
 
         else:
             FDDebug.debug("当前已经是最新版本", type='success', who=self.__class__.__name__)
-            if not self.first_check:
+            if manual:
                 QMessageBox.information(self.ui, "检查更新完成", "当前已经是最新版本: " + global_var.current_version)
 
-        self.first_check = False
-
     def syncTemplates(self):
-        # 同步计数
-        cnt_found = 0
-        cnt_new = 0
-        cnt_existed = 0
-        cnt_changed = 0
-        cnt_downloaded = 0
-
-        # 从Github同步模板
+
+        # 正在同步时取消同步
+        if self.sync_worker is not None:
+            self.cancelSync()
+            return
+
+        # 从Github同步模板，网络请求和文件写入在后台线程中进行，主界面可以继续使用
         FDDebug.debug("开始同步模板", who=self.__class__.__name__)
 
         # 若不存在模板文件夹则建立模板文件夹
         if not os.path.exists("FDTemplates"):
             os.mkdir("FDTemplates")
 
-        try:
-            r = requests.get(url='https://api.github.com/repos/Pitrick3141/DontFDHere/contents/FDTemplates',
-                             params={'ref': 'master'})
-        except requests.exceptions.ConnectionError:
-            FDDebug.debug("网络连接异常，同步模板失败", type='error', who=self.__class__.__name__)
-            return
+        # 增量同步模式: 一次获取云端完整文件树，改动的模板从一个压缩包中取出
+        self.delta_sync = global_var.get_config('delta_sync') is True
 
-        # 反序列化json数据
-        json_data = r.json()
+        # 同名模板处理方式: 未配置或配置有误时逐个询问
+        self.sync_policy = global_var.get_config('sync_policy')
+        if self.sync_policy not in FDSync.sync_policies:
+            self.sync_policy = FDSync.default_policy
 
-        FDDebug.debug("已获取模板列表", type='success', who=self.__class__.__name__)
+        # 按修改时间处理同名模板时，在后台获取同名但内容不同的模板的云端修改时间
+        local_hashes = None
+        if self.sync_policy == 'newest':
+            local_hashes = dict((hash_value, global_var.get_templates_hash(hash_value))
+                                for hash_value in global_var.templates_hash_keys())
 
-        # 新模板列表
-        new_templates = []
+        worker = FDSyncWorker.ListWorker(self.delta_sync, local_hashes, self.ui)
+        worker.listed.connect(lambda listing, stale, remote_times, time_error: self.templatesListed(
+            worker, listing, stale, remote_times, time_error), Qt.QueuedConnection)
+        worker.failed.connect(lambda message: self.syncFailed(worker, message), Qt.QueuedConnection)
+        self.sync_worker = worker
 
-        # 遍历云端模板列表
-        for template in json_data:
-            cnt_found += 1
+        self.ui.buttonSyncTemplates.setText("取消同步")
+        worker.start()
 
-            # 获取模板信息
-            name = template['name'].replace('.json', '')
-            sha = template['sha']
-            file_size = template['size']
-            download_url = template['download_url']
+    def cancelSync(self):
 
-            # 检查是否有新模板
-            if name not in global_var.templates_hash_values():
-                cnt_new += 1
+        # 取消正在进行的同步，已下载的模板会被保留
+        if self.sync_worker is None:
+            return
+        FDDebug.debug("正在取消同步模板", type='warn', who=self.__class__.__name__)
+        self.sync_worker.cancel()
+        if isinstance(self.sync_worker, FDSyncWorker.ListWorker):
+            self.syncEnded()
+
+    def syncEnded(self):
+
+        # 同步结束，恢复同步按钮
+        self.sync_worker = None
+        if self.sync_progress is not None:
+            self.sync_progress.close()
+            self.sync_progress = None
+        self.ui.buttonSyncTemplates.setText("从云端同步模板")
+
+    def syncFailed(self, worker, message):
+        if worker is not self.sync_worker:
+            return
+        self.syncEnded()
+        FDDebug.debug(message, type='error', who=self.__class__.__name__)
+
+    @staticmethod
+    def localTime(name: str):
+        # 本地同名模板的修改时间，无法获取时返回None
+        for index in range(global_var.len_templates()):
+            template = global_var.get_templates(index)
+            if not template.get('name') == name:
+                continue
+            try:
+                if template.get('store_id') is not None:
+                    return FDStore.openStore().modified(template.get('store_id'))
+                return os.path.getmtime(template.get('path'))
+            except (FDTemplate.TemplateError, sqlite3.Error, OSError, TypeError):
+                return None
+        return None
 
-                FDDebug.debug("发现新模板: {}<br>大小: {} Bytes".format(name, file_size), who=self.__class__.__name__)
+    def templatesListed(self, worker, json_data, stale, remote_times, time_error):
 
-                # 加入新模板列表中
-                new_templates.append((name, file_size, download_url))
+        # 忽略已被取消的同步
+        if worker is not self.sync_worker:
+            return
 
-            # 重名模板检查哈希值是否相同
-            elif sha not in global_var.templates_hash_keys():
-                cnt_changed += 1
+        if stale:
+            FDDebug.debug("网络连接异常或处于离线模式，使用缓存的模板列表", type='warn', who=self.__class__.__name__)
+        FDDebug.debug("已获取模板列表", type='success', who=self.__class__.__name__)
 
-                # 哈希值不同弹窗确认是否覆盖
-                FDDebug.debug("发现改动的模板: {}<br>大小: {} Bytes, 已弹窗询问".format(name, file_size),
-                              who=self.__class__.__name__)
-                msgbox = QMessageBox()
-                msgbox.setWindowTitle("下载模板确认")
-                msgbox.setText("云端模板与本地模板同名但内容不同\n是否覆盖下载？")
-                msgbox.setInformativeText("当前本地同名模板:{0}\\FDTemplates\\{1}.json".format(os.getcwd(), name))
-                msgbox.setIcon(QMessageBox.Warning)
-                msgbox.setStandardButtons(QMessageBox.Yes | QMessageBox.Ok | QMessageBox.No)
-                msgbox.setDefaultButton(QMessageBox.Yes)
-                msgbox.setButtonText(QMessageBox.Yes, "覆盖下载")
-                msgbox.setButtonText(QMessageBox.Ok, "重命名下载")
-                msgbox.setButtonText(QMessageBox.No, "不下载")
-                ret = msgbox.exec_()
-
-                if ret == QMessageBox.Yes:
-                    # 覆盖下载
-                    FDDebug.debug("已选择覆盖下载模板: {}".format(name), who=self.__class__.__name__)
-                    if self.downloadTemplate(download_url, name):
-                        cnt_downloaded += 1
-
-                elif ret == QMessageBox.Ok:
-                    # 重命名下载
-                    FDDebug.debug("已选择重命名下载模板: {}".format(name), who=self.__class__.__name__)
-                    if self.downloadTemplate(download_url, name + "_云端同步"):
-                        cnt_downloaded += 1
+        # 将云端模板分为新模板、改动的模板和已是最新的模板
+        new_templates, changed_templates, existed_templates = FDSync.classify(json_data,
+                                                                              global_var.templates_hash_keys(),
+                                                                              global_var.templates_hash_values())
+        cnt_found = len(json_data)
+        cnt_new = len(new_templates)
+        cnt_existed = len(existed_templates)
+        cnt_changed = len(changed_templates)
+
+        for template in existed_templates:
+            FDDebug.debug("模板已存在: {}, 跳过同步".format(global_var.get_templates_hash(template['sha'])),
+                          type='warn',
+                          who=self.__class__.__name__)
+
+        # 待下载的模板: [(保存名称, 云端模板信息)]
+        downloads = []
+
+        # 同名但内容不同的模板: 按同步策略处理，或汇总到一个表格中一次选择
+        if len(changed_templates) > 0:
+            names = [template['name'].replace('.json', '') for template in changed_templates]
+            if self.sync_policy == 'ask':
+                FDDebug.debug("发现{}个改动的模板, 已弹窗询问".format(cnt_changed), who=self.__class__.__name__)
+                if FDStore.isEnabled():
+                    location = FDStore.store_path + ": {0}"
                 else:
-                    # 不下载
-                    FDDebug.debug("已选择不下载模板: {}, 跳过同步".format(name), type='warn', who=self.__class__.__name__)
-
+                    location = os.getcwd() + "\\FDTemplates\\{0}.json"
+                selected = FDConflicts.review(self.ui, [(name, template['size'], location.format(name))
+                                                        for name, template in zip(names, changed_templates)])
+                # 取消时所有同名模板都不下载
+                if selected is None:
+                    selected = ['skip'] * len(changed_templates)
             else:
-                cnt_existed += 1
-                FDDebug.debug("模板已存在: {}, 跳过同步".format(global_var.get_templates_hash(sha)),
-                              type='warn',
+                selected = [FDSync.resolve(self.sync_policy, self.localTime(name), remote_times.get(template['path']))
+                            for name, template in zip(names, changed_templates)]
+
+                # 按修改时间处理时，无法获取云端修改时间的模板不下载并提示用户
+                if self.sync_policy == 'newest':
+                    missing = [name for name, template in zip(names, changed_templates)
+                               if template['path'] not in remote_times]
+                    if len(missing) > 0:
+                        message = "{0}个同名模板无法获取云端修改时间，未下载: {1}".format(len(missing), ", ".join(missing))
+                        if time_error:
+                            message += "\n原因: {0}".format(time_error)
+                        FDDebug.debug(message, type='warn', who=self.__class__.__name__)
+                        QMessageBox.warning(self.ui, "同步模板", message)
+
+            for name, template, action in zip(names, changed_templates, selected):
+                if action == 'skip':
+                    FDDebug.debug("不下载模板: {}, 跳过同步".format(name), type='warn', who=self.__class__.__name__)
+                    continue
+                FDDebug.debug("{}下载模板: {}".format("覆盖" if action == 'overwrite' else "重命名", name),
                               who=self.__class__.__name__)
+                downloads.append((FDSync.saveName(name, action), template))
 
-        # 弹窗提示并下载所有新模板
+        # 新模板: 询问模式下弹窗确认，其他同步策略直接下载
         if len(new_templates) > 0:
-            str_new_templates = "是否下载如下{}个新模板:\n".format(len(new_templates))
-            for (temp_name, temp_size, temp_url) in new_templates:
-                str_new_templates += "模板名称: {}.json 模板大小: {}Bytes ({}MB)\n".format(
-                    temp_name,
-                    temp_size,
-                    temp_size / 1000000)
-            ret = QMessageBox.question(self.ui, "下载模板确认", str_new_templates)
+            for template in new_templates:
+                FDDebug.debug("发现新模板: {}<br>大小: {} Bytes".format(template['name'].replace('.json', ''),
+                                                                    template['size']),
+                              who=self.__class__.__name__)
+            ret = QMessageBox.Yes
+            if self.sync_policy == 'ask':
+                str_new_templates = "是否下载如下{}个新模板:\n".format(len(new_templates))
+                for template in new_templates:
+                    str_new_templates += "模板名称: {} 模板大小: {}Bytes ({}MB)\n".format(
+                        template['name'],
+                        template['size'],
+                        template['size'] / 1000000)
+                ret = QMessageBox.question(self.ui, "下载模板确认", str_new_templates)
 
             if ret == QMessageBox.Yes:
-                for (temp_name, temp_size, temp_url) in new_templates:
-                    if self.downloadTemplate(temp_url, temp_name):
-                        cnt_downloaded += 1
+                for template in new_templates:
+                    downloads.append((template['name'].replace('.json', ''), template))
+
+        self.sync_counts = (cnt_found, cnt_existed, cnt_changed, cnt_new)
+
+        # 询问期间同步被取消
+        if worker is not self.sync_worker:
+            return
+
+        if len(downloads) == 0:
+            self.syncEnded()
+            self.syncSummary(0)
+            return
+
+        # 在后台线程中下载所有选择的模板
+        FDDebug.debug("开始下载{0}个模板".format(len(downloads)), who=self.__class__.__name__)
+        worker = FDSyncWorker.DownloadWorker(downloads,
+                                             self.delta_sync,
+                                             global_var.get_config('sync_mirror_dir'),
+                                             self.ui)
+        worker.progress.connect(lambda done, total, name: self.downloadProgress(worker, done, total, name),
+                                Qt.QueuedConnection)
+        worker.saved.connect(lambda name: self.templateSaved(worker, name), Qt.QueuedConnection)
+        worker.downloadFinished.connect(lambda cnt, errors, cancelled: self.downloadFinished(worker, cnt, errors,
+                                                                                            cancelled),
+                                        Qt.QueuedConnection)
+        self.sync_worker = worker
+
+        # 非模态的下载进度窗口，不阻塞主界面
+        self.sync_progress = QProgressDialog("正在下载模板...", "取消下载", 0, len(downloads), self.ui)
+        self.sync_progress.setWindowTitle("同步模板")
+        self.sync_progress.setWindowModality(Qt.NonModal)
+        self.sync_progress.setAutoClose(False)
+        self.sync_progress.setAutoReset(False)
+        self.sync_progress.setMinimumDuration(0)
+        self.sync_progress.canceled.connect(self.cancelSync)
+
+        worker.start()
+
+    def downloadProgress(self, worker, done, total, name):
+        if worker is not self.sync_worker or self.sync_progress is None:
+            return
+        if name == "":
+            # 下载压缩包，总大小未知时显示忙碌状态
+            self.sync_progress.setLabelText("正在下载模板压缩包... {0:.2f} MB".format(done / 1000000))
+            self.sync_progress.setMaximum(total)
+            self.sync_progress.setValue(done if total else 0)
+        else:
+            self.sync_progress.setLabelText("正在下载模板... ({0}/{1})\n{2}".format(done, total, name))
+            self.sync_progress.setMaximum(total)
+            self.sync_progress.setValue(done)
+
+    def templateSaved(self, worker, name):
+        if worker is not self.sync_worker:
+            return
+        FDDebug.debug("已保存同步的模板: {0}".format(name), type='success', who=self.__class__.__name__)
+
+    def downloadFinished(self, worker, cnt, errors, cancelled):
+        if worker is not self.sync_worker:
+            return
+        self.syncEnded()
+
+        if cancelled:
+            FDDebug.debug("已取消同步模板，已保存{0}个模板".format(cnt), type='warn', who=self.__class__.__name__)
+
+        for name, error in errors:
+            FDDebug.debug("模板下载失败: {0}, {1}".format(name, error), type='error', who=self.__class__.__name__)
+        self.reportErrors(errors)
 
         # 刷新模板列表
-        if not cnt_downloaded == 0:
+        if not cnt == 0:
             FDMain.loadTemplates()
 
+        self.syncSummary(cnt)
+
+    def syncSummary(self, cnt_downloaded):
+
+        # 显示同步结果
+        cnt_found, cnt_existed, cnt_changed, cnt_new = self.sync_counts
+
         FDDebug.debug("模板同步完成"
                       "\n在云端共发现了{}个模板"
                       "\n其中{}个模板已是最新"
@@ -257,29 +431,23 @@ class FDMenu:
                                     cnt_new,
                                     cnt_downloaded))
 
-    @staticmethod
-    def downloadTemplate(url, name) -> bool:
-        FDDebug.debug("开始从{}下载模板".format(url), who='FDMenu')
-        try:
-            r = requests.get(url=url)
-        except requests.exceptions.ConnectionError:
-            FDDebug.debug("网络连接异常，模板下载失败", type='error', who='FDMenu')
-            return False
-
-        content = r.json()
-        with open("FDTemplates\\{0}.json".format(name), "w") as f:
-            json.dump(content, f)
-        FDDebug.debug("模板文件已保存至{0}\\FDTemplates\\{1}.json".format(os.getcwd(), name),
-                      type='success',
-                      who='FDMenu')
+    def reportErrors(self, errors):
 
-        return True
+        # 汇总下载失败的模板
+        if len(errors) > 0:
+            msgbox = QMessageBox(self.ui)
+            msgbox.setWindowTitle("模板下载失败")
+            msgbox.setText("{0}个模板下载失败".format(len(errors)))
+            msgbox.setDetailedText("\n".join("{0}: {1}".format(name, error) for name, error in errors))
+            msgbox.setIcon(QMessageBox.Warning)
+            msgbox.exec_()
 
     def importTemplate(self):
 
         # 打开选择文件对话框
         file_dialog = QFileDialog(self.ui)
-        file_dir = file_dialog.getOpenFileName(self.ui, "导入模板文件", os.getcwd(), "模板文件 (*.json)")
+        file_dir = file_dialog.getOpenFileName(self.ui, "导入模板文件", os.getcwd(),
+                                               "模板文件 (*.json);;模板包 (*{0})".format(FDBundle.bundle_extension))
 
         # 若未选择任何文件就关闭对话框
         if file_dir[0] == "":
@@ -289,75 +457,156 @@ class FDMenu:
         # 打开选择的文件并导入
         FDDebug.debug("正在尝试导入模板文件{0}...".format(file_dir[0]), who=self.__class__.__name__)
 
-        with open(file_dir[0], 'rb') as f:
-            # hash
-            data = f.read()
-            hash_obj = hashlib.sha1()
-            hash_str = "blob %u\0" % len(data) + data.decode('utf-8')
-            hash_obj.update(hash_str.encode('utf-8'))
-            hash_value = hash_obj.hexdigest()
+        # 显示的相对路径名称
+        display_name = file_dir[0]
 
-        with open(file_dir[0], 'rb') as load_json:
+        try:
+            # 导入模板包
+            if FDBundle.isBundle(file_dir[0]):
+                bundle = FDBundle.openBundle(file_dir[0])
+                entry = {'bundle': []}
+                for index in range(len(bundle)):
+                    data = bundle.template(index)
+                    data['bundle_index'] = index
+                    entry['bundle'].append({'hash': bundle.hash(index), 'data': data})
+
+            # 导入模板文件
+            else:
+                hash_value, data = FDTemplate.readTemplate(file_dir[0])
+                if not FDTemplate.isConfig(data):
+                    FDTemplate.checkTemplate(data)
+                entry = {'hash': hash_value, 'data': data}
+
+        # 模板文件已损坏：内容为空、不合法、编码有误或缺失必需的键值对
+        except (FDTemplate.TemplateError, OSError, UnicodeDecodeError) as e:
+            FDDebug.debug("已损坏的模板文件：{0}, {1}, 跳过当前模板文件".format(display_name, e),
+                          type='error',
+                          who=self.__class__.__name__)
+            return
 
-            # 模板文件字典
-            data = {}
-            # 缺少的键值对
-            missed_keys = []
-            # 显示的相对路径名称
-            display_name = file_dir[0]
+        # 将模板添加到模板列表和模板列表框中，配置文件和重复的模板由主界面处理
+        if FDMain.addTemplate(display_name, file_dir[0], entry):
+            FDDebug.debug("已导入模板文件: " + display_name, type='success', who=self.__class__.__name__)
 
-            # 尝试读取模板文件并转换为字典
-            try:
-                original_data = json.load(load_json)
+    def exportBundle(self):
 
-            # 解码失败异常：一般是内容为空或者不合法
-            except json.decoder.JSONDecodeError:
-                FDDebug.debug("已损坏的模板文件：{0}, 模板文件内容为空或不合法, 跳过当前模板文件".format(display_name),
-                              type='error',
-                              who=self.__class__.__name__)
-                return
-            except UnicodeDecodeError:
-                FDDebug.debug("已损坏的模板文件：{0}, 模板文件编码格式有误, 跳过当前模板文件".format(display_name),
-                              type='error',
-                              who=self.__class__.__name__)
-                return
-
-            # 将键全部转换为小写，避免大小写混淆
-            for key, value in original_data.items():
-                data[key.lower()] = value
-
-            # 检测是否是配置文件
-            if 'config' in data.keys():
-                FDDebug.debug("发现配置文件：{0}, 开始解析".format(display_name), who=self.__class__.__name__)
-                FDMain.applyConfig(data)
-                return
-
-            # 检测是否有缺失的必需键值对
-            for checked_key in ['name', 'content', 'rolename', 'roledes']:
-                if checked_key not in data.keys():
-                    missed_keys.append(checked_key)
-
-            # 如果有缺失的关键键值对
-            if not len(missed_keys) == 0:
-                FDDebug.debug("已损坏的模板文件：{0}, 缺失如下键值对:{1}, 跳过当前模板文件"
-                              .format(display_name, missed_keys),
-                              type='error',
-                              who=self.__class__.__name__)
-                return
+        # 将当前载入的所有模板导出为模板包
+        if global_var.len_templates() == 0:
+            QMessageBox.warning(self.ui, "导出模板包", "当前没有载入任何模板", QMessageBox.Ok)
+            return
 
-            # 检测是否已经添加了相同的模板
-            elif hash_value in global_var.templates_hash_keys():
-                FDDebug.debug("已经载入相同的模板文件: {0}, 跳过当前模板文件"
-                              .format(global_var.get_templates_hash(hash_value)),
-                              type='warn',
-                              who=self.__class__.__name__)
-                return
+        file_dialog = QFileDialog(self.ui)
+        file_dir = file_dialog.getSaveFileName(self.ui, "导出模板包", os.getcwd(),
+                                               "模板包 (*{0})".format(FDBundle.bundle_extension))
+
+        # 若未选择任何文件就关闭对话框
+        if file_dir[0] == "":
+            FDDebug.debug("已取消导出模板包", type='warn', who=self.__class__.__name__)
+            return
+
+        path = file_dir[0]
+        if not FDBundle.isBundle(path):
+            path += FDBundle.bundle_extension
+
+        def templates():
+            # 逐个读取模板内容，懒加载模式下模板内容从原文件读取
+            for index in range(global_var.len_templates()):
+                data = global_var.get_templates(index)
+                if 'content' not in data:
+                    data = dict(data)
+                    if data.get('bundle_index') is not None:
+                        data['content'] = FDBundle.readContent(data.get('path'), data.get('bundle_index'))
+                    elif data.get('store_id') is not None:
+                        data['content'] = FDStore.readContent(data.get('store_id'))
+                    else:
+                        data['content'] = FDTemplate.readContent(data.get('path'))
+                yield data.get('hash'), data
+
+        try:
+            cnt = FDBundle.writeBundle(path, templates())
+        except (FDTemplate.TemplateError, OSError, UnicodeDecodeError, sqlite3.Error) as e:
+            FDDebug.debug("导出模板包失败: {0}".format(e), type='error', who=self.__class__.__name__)
+            QMessageBox.critical(self.ui, "导出模板包", "导出模板包失败: {0}".format(e), QMessageBox.Ok)
+            return
+
+        FDDebug.debug("已导出{0}个模板到模板包{1}".format(cnt, path), type='success', who=self.__class__.__name__)
+        QMessageBox.information(self.ui, "导出模板包", "已导出{0}个模板到模板包\n{1}".format(cnt, path))
+
+    def importStore(self):
+
+        # 将模板文件目录中的所有模板导入模板数据库，此后从模板数据库载入模板
+        msgbox = QMessageBox(self.ui)
+        msgbox.setWindowTitle("导入到模板数据库")
+        msgbox.setText("是否将模板文件目录中的所有模板导入模板数据库？")
+        msgbox.setInformativeText("导入后将从模板数据库{0}载入模板，删除该文件即可恢复使用模板文件目录".format(
+            FDStore.store_path))
+        msgbox.setIcon(QMessageBox.Question)
+        msgbox.setStandardButtons(QMessageBox.Yes | QMessageBox.No)
+        if not msgbox.exec_() == QMessageBox.Yes:
+            return
+
+        try:
+            cnt, errors = FDStore.openStore().importDirectory()
+        except (FDTemplate.TemplateError, sqlite3.Error) as e:
+            FDDebug.debug("导入模板数据库失败: {0}".format(e), type='error', who=self.__class__.__name__)
+            QMessageBox.critical(self.ui, "导入到模板数据库", "导入模板数据库失败: {0}".format(e), QMessageBox.Ok)
+            return
+
+        for file_path, error in errors:
+            FDDebug.debug("未导入的模板文件：{0}, {1}, 跳过当前模板文件".format(file_path, error),
+                          type='error',
+                          who=self.__class__.__name__)
+        FDDebug.debug("已导入{0}个模板到模板数据库".format(cnt), type='success', who=self.__class__.__name__)
+        QMessageBox.information(self.ui, "导入到模板数据库",
+                                "已导入{0}个模板到模板数据库, {1}个模板文件已损坏或与其他模板同名未导入".format(
+                                    cnt, len(errors)))
+
+        FDMain.reloadTemplates()
+
+    def exportStore(self):
+
+        # 将模板数据库中的所有模板导出到模板文件目录
+        if not FDStore.isEnabled():
+            QMessageBox.warning(self.ui, "导出模板文件", "当前未使用模板数据库", QMessageBox.Ok)
+            return
+
+        try:
+            cnt = FDStore.openStore().exportDirectory()
+        except (FDTemplate.TemplateError, sqlite3.Error, OSError) as e:
+            FDDebug.debug("导出模板文件失败: {0}".format(e), type='error', who=self.__class__.__name__)
+            QMessageBox.critical(self.ui, "导出模板文件", "导出模板文件失败: {0}".format(e), QMessageBox.Ok)
+            return
+
+        FDDebug.debug("已从模板数据库导出{0}个模板文件".format(cnt), type='success', who=self.__class__.__name__)
+        QMessageBox.information(self.ui, "导出模板文件",
+                                "已导出{0}个模板文件到{1}\\FDTemplates".format(cnt, os.getcwd()))
+
+    def findDuplicates(self):
+
+        # 列出内容相似的模板(例如只有空白字符不同或改动了个别句子的重复上传)
+        groups = FDDuplicate.groups()
+
+        if len(groups) == 0:
+            FDDebug.debug("没有发现相似的模板", type='success', who=self.__class__.__name__)
+            QMessageBox.information(self.ui, "查找相似模板", "没有发现相似的模板")
+            return
+
+        report = ""
+        for group in groups:
+            report += "------\n"
+            for template_hash, name in group:
+                report += "{0} ({1})\n".format(name, template_hash[:7])
+        FDDebug.debug("发现{0}组相似模板:<br>{1}".format(len(groups), report.replace("\n", "<br>")),
+                      type='warn',
+                      who=self.__class__.__name__)
 
-            # 将模板添加到模板列表和模板列表框中
-            global_var.templates_append(data)
-            global_var.set_templates_hash(hash_value, data.get('name'))
-            self.ui.comboBox.addItem(data.get('name'))
-        FDDebug.debug("已载入模板文件: " + data.get('name'), type='success', who=self.__class__.__name__)
+        msgbox = QMessageBox(self.ui)
+        msgbox.setWindowTitle("查找相似模板")
+        msgbox.setText("发现{0}组相似模板, 共{1}个模板".format(len(groups), sum(len(group) for group in groups)))
+        msgbox.setInformativeText("相似模板可能是重复上传或云端同步时重命名下载的模板，可在模板目录中手动整理")
+        msgbox.setDetailedText(report)
+        msgbox.setIcon(QMessageBox.Information)
+        msgbox.exec_()
 
     @staticmethod
     def showDebug():
@@ -398,6 +647,6 @@ def syncTemplates():
     return
 
 
-def checkUpdate():
-    fdMenu.checkUpdate()
+def checkUpdate(startup: bool = False):
+    fdMenu.checkUpdate(startup)
     return
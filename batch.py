@@ -0,0 +1,193 @@
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+
+import FDReplace
+import FDTemplate
+
+# 命令行批量生成法典，不需要创建 QApplication
+# 用法: python batch.py 模板名称或路径 替换内容.csv|替换内容.jsonl [-o 输出文件]
+
+
+class RowsError(Exception):
+    # 替换内容文件读取失败，与写入输出文件失败区分
+    pass
+
+
+def readRows(f, file_format: str):
+    # 从已打开的替换内容文件逐行读取，每行产生一个 关键词 -> 替换内容 的字典
+    # 文件在生成时才被逐行读取，读取或解码失败时抛出 RowsError
+
+    with f:
+        try:
+
+            # CSV: 首行为关键词，之后每行为一组替换内容
+            if file_format == 'csv':
+                for row in csv.DictReader(f):
+                    # 与主界面一致，替换内容为空时不替换
+                    yield dict((key, value) for key, value in row.items() if key and value)
+
+            # JSONL: 每行为一个 关键词 -> 替换内容 的json对象，null 与空字符串一样不替换
+            else:
+                for line_number, line in enumerate(f, 1):
+                    if line.strip() == "":
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except json.decoder.JSONDecodeError:
+                        raise SystemExit("第{0}行不是合法的json: {1}".format(line_number, f.name))
+                    if not isinstance(row, dict):
+                        raise SystemExit("第{0}行不是json对象: {1}".format(line_number, f.name))
+                    yield dict((key, str(value)) for key, value in row.items() if value is not None and value != "")
+
+        except (OSError, UnicodeDecodeError) as e:
+            raise RowsError(str(e))
+
+
+def writeResults(results, output, output_format: str, separator: str) -> int:
+    # 逐条写出生成结果，返回输出的条数
+    cnt = 0
+    for result in results:
+        if output_format == 'jsonl':
+            output.write(json.dumps(result, ensure_ascii=False))
+            output.write("\n")
+        else:
+            if cnt > 0:
+                output.write(separator)
+            output.write(result)
+        cnt += 1
+    if output_format == 'text' and cnt > 0:
+        output.write("\n")
+    return cnt
+
+
+def renderRows(compiled: FDReplace.CompiledTemplate, rows):
+    for row in rows:
+        yield compiled.render(row)
+
+
+# 子进程中的预编译模板，每个子进程只在启动时接收一次
+worker_compiled = None
+
+
+def initWorker(compiled: FDReplace.CompiledTemplate) -> None:
+    global worker_compiled
+    worker_compiled = compiled
+
+
+def renderChunk(rows: list) -> list:
+    return [worker_compiled.render(row) for row in rows]
+
+
+def chunkRows(rows, chunk_size: int):
+    # 将替换内容按固定大小分块
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def renderRowsParallel(compiled: FDReplace.CompiledTemplate, rows, jobs: int, chunk_size: int):
+    # 使用进程池并行生成，结果按输入顺序返回
+
+    with multiprocessing.Pool(jobs, initializer=initWorker, initargs=(compiled,)) as pool:
+
+        # 在途的分块，最多同时提交 jobs * 2 个以限制缓冲的内存
+        pending = deque()
+        for chunk in chunkRows(rows, chunk_size):
+            pending.append(pool.apply_async(renderChunk, (chunk,)))
+            if len(pending) >= jobs * 2:
+                yield from pending.popleft().get()
+
+        while pending:
+            yield from pending.popleft().get()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="别在这立法典 DontFDHere 命令行批量生成")
+    parser.add_argument('template', help="模板名称、FDTemplates中的文件名或模板文件路径")
+    parser.add_argument('rows', help="替换内容文件(.csv 或 .jsonl)")
+    parser.add_argument('-o', '--output', help="输出文件，默认输出到标准输出")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="替换内容文件格式，默认按拓展名判断")
+    parser.add_argument('--output-format', choices=['text', 'jsonl'], default='text',
+                        help="输出格式: text 以分隔符分隔, jsonl 每行一个json字符串")
+    parser.add_argument('--separator', default="\n" + "-" * 10 + "\n", help="text 输出时每条结果之间的分隔符")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="并行生成的进程数，0 表示使用全部CPU核心")
+    parser.add_argument('--chunk-size', type=int, default=256, help="并行生成时每次分发给子进程的行数")
+    args = parser.parse_args(argv)
+    if args.jobs < 0:
+        parser.error("进程数不能为负数: {0}".format(args.jobs))
+
+    file_format = args.format
+    if file_format is None:
+        file_format = 'csv' if args.rows.lower().endswith('.csv') else 'jsonl'
+
+    # 读取并预编译模板
+    try:
+        path = FDTemplate.findTemplate(args.template)
+        hash_value, data = FDTemplate.readTemplate(path)
+        FDTemplate.checkTemplate(data)
+    except (FDTemplate.TemplateError, OSError) as e:
+        print("模板读取失败: {0}".format(e), file=sys.stderr)
+        return 1
+    compiled = FDReplace.compileTemplate(data)
+
+    # 先打开替换内容文件，文件不存在或无法读取时不改动输出文件
+    try:
+        rows_file = open(args.rows, 'r', encoding='utf-8-sig', newline='')
+    except OSError as e:
+        parser.error("读取替换内容失败: {0}, {1}".format(args.rows, e))
+
+    # 输出到文件或标准输出，输出到文件时先写入临时文件，全部生成后再替换，失败时保留原有的输出文件
+    try:
+        if args.output:
+            output = open(args.output + ".part", 'w', encoding='utf-8', newline='')
+        else:
+            sys.stdout.reconfigure(encoding='utf-8')
+            output = sys.stdout
+    except OSError as e:
+        rows_file.close()
+        print("写入输出文件失败: {0}".format(e), file=sys.stderr)
+        return 1
+
+    # 选择单进程或多进程生成
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    rows = readRows(rows_file, file_format)
+    if jobs > 1:
+        results = renderRowsParallel(compiled, rows, jobs, max(args.chunk_size, 1))
+    else:
+        results = renderRows(compiled, rows)
+
+    completed = False
+    try:
+        cnt = writeResults(results, output, args.output_format, args.separator)
+        if args.output:
+            output.close()
+            os.replace(args.output + ".part", args.output)
+        completed = True
+    except RowsError as e:
+        parser.error("读取替换内容失败: {0}, {1}".format(args.rows, e))
+    except OSError as e:
+        print("写入输出文件失败: {0}".format(e), file=sys.stderr)
+        return 1
+    finally:
+        rows_file.close()
+        if args.output and not completed:
+            output.close()
+            if os.path.exists(args.output + ".part"):
+                os.remove(args.output + ".part")
+
+    print("已使用模板{0}生成{1}条结果".format(data.get('name'), cnt), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
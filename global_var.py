@@ -1,5 +1,3 @@
-from PySide2.QtGui import QIcon
-
 # 当前版本号，用于检查更新
 
 current_version = 'v1.3.0'
@@ -8,9 +6,9 @@ current_version = 'v1.3.0'
 
 global app_icon
 
-# 配置项字典
+# 配置项字典，命令行工具不调用 init() 时也可以读写配置项
 
-global _configs
+_configs = {}
 
 # 模板列表
 global _templates
@@ -18,11 +16,17 @@ global _templates
 # 模板hash字典，用于同步模板
 global _templates_hash
 
+# 预编译模板字典，以模板hash为键，模板文件未改动时无需重新编译
+global _templates_compiled
+
 
 def init():
     global _configs
     _configs = {}
 
+    # 命令行工具不调用 init()，不需要安装 PySide2
+    from PySide2.QtGui import QIcon
+
     global app_icon
     app_icon = QIcon("ui\\icon.png")
 
@@ -32,6 +36,9 @@ def init():
     global _templates_hash
     _templates_hash = {}
 
+    global _templates_compiled
+    _templates_compiled = {}
+
     return
 
 
@@ -65,6 +72,11 @@ def set_templates_hash(key, value):
     return
 
 
+def templates_hash_pop(key):
+    _templates_hash.pop(key, None)
+    return
+
+
 def templates_hash_clear():
     _templates_hash.clear()
     return
@@ -79,6 +91,15 @@ def get_templates(value):
     return _templates[value]
 
 
+def set_templates(index, value):
+    _templates[index] = value
+    return
+
+
+def templates_pop(index):
+    return _templates.pop(index)
+
+
 def len_templates():
     return len(_templates)
 
@@ -86,3 +107,21 @@ def len_templates():
 def templates_clear():
     _templates.clear()
     return
+
+
+def get_templates_compiled(key):
+    return _templates_compiled.get(key)
+
+
+def set_templates_compiled(key, value):
+    _templates_compiled[key] = value
+    return
+
+
+def templates_compiled_keys():
+    return list(_templates_compiled.keys())
+
+
+def templates_compiled_pop(key):
+    _templates_compiled.pop(key, None)
+    return
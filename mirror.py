@@ -0,0 +1,367 @@
+import argparse
+import datetime
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import FDTemplate
+
+# 本地替身服务器: 以与GitHub相同的格式提供一个目录中的文件，用于在没有网络或网络较慢时测试同步、更新和恢复模式
+# 用法: python mirror.py [仓库目录] [--release 发布文件目录] [--port 端口] [--delay 毫秒]
+# 之后将配置项 mirror_url 或环境变量 FD_MIRROR_URL 设置为 http://127.0.0.1:端口
+#
+# 提供的端点，地址中的仓库名和分支名均被忽略:
+#   /api/repos/{仓库}/contents/{路径}       目录列表
+#   /api/repos/{仓库}/git/trees/{分支}      完整文件树
+#   /api/repos/{仓库}/commits/{分支}        最近一次提交，提交时间为最近修改的文件的修改时间
+#   /api/repos/{仓库}/commits?path={路径}   改动该文件的提交，只有一次提交，提交时间为该文件的修改时间
+#   /api/repos/{仓库}/releases/latest       最新版本信息，需要 --release
+#   /raw/{仓库}/{分支}/{路径}                文件内容
+#   /codeload/{仓库}/zip/refs/heads/{分支}   仓库压缩包
+#   /download/{仓库}/releases/download/{版本}/{文件名}  发布文件
+
+# 不提供的目录
+ignored_dirs = ['.git', '__pycache__', 'FDHttpCache']
+
+# 流式发送文件时每次发送的大小
+chunk_size = 65536
+
+
+class Mirror:
+    # 仓库目录的文件索引，文件大小和修改时间未改变时不重新计算blob hash
+
+    def __init__(self, root: str, release_dir: str = None):
+        self.root = os.path.abspath(root)
+        self.release_dir = os.path.abspath(release_dir) if release_dir else None
+        # 文件路径 -> (大小, 修改时间, blob hash)
+        self.hashes = {}
+        # 压缩包缓存: (文件树签名, 压缩包内容)
+        self.archive = (None, b"")
+        self.lock = threading.Lock()
+
+    def blobHash(self, path: str) -> str:
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.hashes.get(path)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        with open(path, 'rb') as f:
+            sha = FDTemplate.blobHash(f.read())
+        with self.lock:
+            self.hashes[path] = (stat.st_size, stat.st_mtime_ns, sha)
+        return sha
+
+    def localPath(self, path: str):
+        # 仓库中的路径对应的本地路径，路径不在仓库目录中时返回None
+        local = os.path.abspath(os.path.join(self.root, *[part for part in path.split("/") if part]))
+        if not (local == self.root or local.startswith(self.root + os.sep)):
+            return None
+        if any(part in ignored_dirs for part in path.split("/")):
+            return None
+        return local
+
+    def files(self):
+        # 逐个返回仓库中的 (路径, 本地路径)，按路径排序
+        for path, dir_list, file_list in os.walk(self.root):
+            dir_list[:] = sorted(name for name in dir_list if name not in ignored_dirs)
+            for file_name in sorted(file_list):
+                local = os.path.join(path, file_name)
+                yield os.path.relpath(local, self.root).replace(os.sep, "/"), local
+
+    def tree(self) -> list:
+        # 完整文件树: [{'path', 'type', 'sha', 'size'}]
+        tree = []
+        dirs = set()
+        for path, local in self.files():
+            parent = path.rsplit("/", 1)[0] if "/" in path else ""
+            while parent and parent not in dirs:
+                dirs.add(parent)
+                tree.append({'path': parent, 'mode': "040000", 'type': 'tree',
+                             'sha': hashlib.sha1(parent.encode('utf-8')).hexdigest()})
+                parent = parent.rsplit("/", 1)[0] if "/" in parent else ""
+            tree.append({'path': path, 'mode': "100644", 'type': 'blob', 'sha': self.blobHash(local),
+                         'size': os.path.getsize(local)})
+        return sorted(tree, key=lambda item: item['path'])
+
+    def signature(self) -> str:
+        # 文件树签名，任何文件改变时签名改变
+        tree = [(item['path'], item['sha']) for item in self.tree()]
+        return hashlib.sha1(json.dumps(tree).encode('utf-8')).hexdigest()
+
+    def contents(self, path: str, base_url: str):
+        # 目录列表，路径为文件时返回文件信息，不存在时返回None
+        local = self.localPath(path)
+        if local is None or not os.path.exists(local):
+            return None
+        path = path.strip("/")
+
+        def entry(name, local_path):
+            item_path = "{0}/{1}".format(path, name) if path else name
+            if os.path.isdir(local_path):
+                return {'name': name, 'path': item_path, 'type': 'dir', 'size': 0,
+                        'sha': hashlib.sha1(item_path.encode('utf-8')).hexdigest(), 'download_url': None}
+            return {'name': name, 'path': item_path, 'type': 'file', 'size': os.path.getsize(local_path),
+                    'sha': self.blobHash(local_path), 'download_url': "{0}/raw/-/-/-/{1}".format(base_url, item_path)}
+
+        if os.path.isfile(local):
+            return entry(path.rsplit("/", 1)[-1], local)
+        return [entry(name, os.path.join(local, name)) for name in sorted(os.listdir(local))
+                if name not in ignored_dirs]
+
+    @staticmethod
+    def commitData(sha: str, mtime: float) -> dict:
+        date = datetime.datetime.fromtimestamp(mtime, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        return {'sha': sha, 'commit': {'committer': {'date': date}, 'message': "mirror"}}
+
+    def commit(self) -> dict:
+        # 最近一次提交，提交时间为最近修改的文件的修改时间
+        latest = max([os.path.getmtime(local) for path, local in self.files()] or [0])
+        return self.commitData(self.signature(), latest)
+
+    def commits(self, path: str = None) -> list:
+        # 提交历史，指定路径时为改动该文件的提交，文件不存在时为空列表
+        if path is None:
+            return [self.commit()]
+        local = self.localPath(path)
+        if local is None or not os.path.isfile(local):
+            return []
+        sha = hashlib.sha1("{0}:{1}".format(path, self.blobHash(local)).encode('utf-8')).hexdigest()
+        return [self.commitData(sha, os.path.getmtime(local))]
+
+    def release(self, base_url: str):
+        # 最新版本信息，版本号为发布文件目录中 release.json 的 tag_name，未指定时为目录名
+        if self.release_dir is None or not os.path.isdir(self.release_dir):
+            return None
+        release = {}
+        release_path = os.path.join(self.release_dir, "release.json")
+        if os.path.exists(release_path):
+            with open(release_path, 'r', encoding='utf-8') as f:
+                release = json.load(f)
+        tag = release.get('tag_name') or os.path.basename(self.release_dir)
+        release.setdefault('tag_name', tag)
+        published = datetime.datetime.fromtimestamp(os.path.getmtime(self.release_dir), datetime.timezone.utc)
+        release.setdefault('published_at', published.strftime("%Y-%m-%dT%H:%M:%SZ"))
+        release.setdefault('body', "")
+        release.setdefault('html_url', "{0}/download/-/-/releases/tag/{1}".format(base_url, tag))
+
+        assets = []
+        for name in sorted(os.listdir(self.release_dir)):
+            local = os.path.join(self.release_dir, name)
+            if name == "release.json" or not os.path.isfile(local):
+                continue
+            digest = hashlib.sha256()
+            with open(local, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    digest.update(chunk)
+            assets.append({'name': name, 'size': os.path.getsize(local), 'digest': "sha256:" + digest.hexdigest(),
+                           'browser_download_url': "{0}/download/-/-/releases/download/{1}/{2}".format(
+                               base_url, tag, name)})
+        release['assets'] = assets
+        return release
+
+    def archiveContent(self) -> (str, bytes):
+        # 仓库压缩包，文件树未改变时使用缓存，返回 (文件树签名, 压缩包内容)
+        signature = self.signature()
+        with self.lock:
+            if self.archive[0] == signature:
+                return self.archive
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path, local in self.files():
+                archive.write(local, "mirror-master/" + path)
+        with self.lock:
+            self.archive = (signature, buffer.getvalue())
+            return self.archive
+
+    def releaseFile(self, name: str):
+        if self.release_dir is None or "/" in name or name in ["", ".", ".."]:
+            return None
+        local = os.path.join(self.release_dir, name)
+        return local if os.path.isfile(local) else None
+
+
+class MirrorHandler(BaseHTTPRequestHandler):
+    # 由 serve() 设置
+    mirror = None
+    delay = 0.0
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        print("{0} {1}".format(self.address_string(), format % args), file=sys.stderr)
+
+    def baseUrl(self) -> str:
+        return "http://{0}".format(self.headers.get('Host', "{0}:{1}".format(*self.server.server_address)))
+
+    def sendJson(self, data) -> None:
+        # 以内容hash作为ETag，条件请求内容未改变时返回304
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        etag = '"{0}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', "application/json; charset=utf-8")
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendError(self, code: int) -> None:
+        body = json.dumps({'message': "Not Found" if code == 404 else "Error"}).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', "application/json; charset=utf-8")
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def sendRange(self, size: int, etag: str):
+        # 处理 Range 和 If-Range 请求头，返回 (起始位置, 结束位置)，范围无效时返回None
+        start, end = 0, size - 1
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and range_header.startswith("bytes=") and (if_range is None or if_range == etag):
+            first, _, last = range_header[len("bytes="):].split(",")[0].partition("-")
+            try:
+                start = int(first) if first else max(size - int(last), 0)
+                end = min(int(last), size - 1) if first and last else size - 1
+            except ValueError:
+                start, end = 0, size - 1
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', "bytes */{0}".format(size))
+                self.send_header('Content-Length', "0")
+                self.end_headers()
+                return None
+            self.send_response(206)
+            self.send_header('Content-Range', "bytes {0}-{1}/{2}".format(start, end, size))
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', "bytes")
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.end_headers()
+        return start, end
+
+    def sendBytes(self, content: bytes, etag: str) -> None:
+        sent = self.sendRange(len(content), etag)
+        if sent is not None:
+            self.wfile.write(content[sent[0]:sent[1] + 1])
+
+    def sendFile(self, local: str) -> None:
+        # 流式发送文件，支持断点续传
+        stat = os.stat(local)
+        etag = '"{0:x}-{1:x}"'.format(stat.st_size, stat.st_mtime_ns)
+        sent = self.sendRange(stat.st_size, etag)
+        if sent is None:
+            return
+        remaining = sent[1] - sent[0] + 1
+        with open(local, 'rb') as f:
+            f.seek(sent[0])
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def do_GET(self):
+        if self.delay > 0:
+            time.sleep(self.delay)
+
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        try:
+            self.route(parts, parse_qs(url.query))
+        except (ConnectionError, BrokenPipeError):
+            return
+
+    def route(self, parts: list, query: dict) -> None:
+        mirror = self.mirror
+
+        # /api/repos/{用户}/{仓库}/...
+        if len(parts) >= 5 and parts[0] == 'api' and parts[1] == 'repos':
+            api = parts[4:]
+            if api[0] == 'contents':
+                data = mirror.contents("/".join(api[1:]), self.baseUrl())
+            elif api[:2] == ['git', 'trees']:
+                data = {'sha': mirror.signature(), 'tree': mirror.tree(), 'truncated': False}
+            elif api == ['commits']:
+                data = mirror.commits(query.get('path', [None])[0])
+            elif api[0] == 'commits':
+                data = mirror.commit()
+            elif api == ['releases', 'latest']:
+                data = mirror.release(self.baseUrl())
+            else:
+                data = None
+            if data is None:
+                self.sendError(404)
+            else:
+                self.sendJson(data)
+            return
+
+        # /raw/{用户}/{仓库}/{分支}/{路径}
+        if len(parts) >= 5 and parts[0] == 'raw':
+            local = mirror.localPath("/".join(parts[4:]))
+            if local is None or not os.path.isfile(local):
+                self.sendError(404)
+            else:
+                self.sendFile(local)
+            return
+
+        # /codeload/{用户}/{仓库}/zip/...
+        if len(parts) >= 4 and parts[0] == 'codeload' and parts[3] == 'zip':
+            signature, content = mirror.archiveContent()
+            self.sendBytes(content, '"{0}"'.format(signature))
+            return
+
+        # /download/{用户}/{仓库}/releases/download/{版本}/{文件名}
+        if len(parts) == 7 and parts[0] == 'download' and parts[3:5] == ['releases', 'download']:
+            local = mirror.releaseFile(parts[6])
+            if local is None:
+                self.sendError(404)
+            else:
+                self.sendFile(local)
+            return
+
+        self.sendError(404)
+
+
+def serve(root: str, host: str, port: int, release_dir: str = None, delay: float = 0.0) -> ThreadingHTTPServer:
+    # 建立替身服务器，调用 serve_forever() 开始服务
+    handler = type('Handler', (MirrorHandler,), {'mirror': Mirror(root, release_dir), 'delay': delay})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="别在这立法典 DontFDHere 本地替身服务器")
+    parser.add_argument('root', nargs='?', default=".", help="以仓库格式提供的目录，默认为当前目录")
+    parser.add_argument('--release', help="发布文件目录，可包含 release.json 指定版本信息")
+    parser.add_argument('--host', default="127.0.0.1", help="监听地址")
+    parser.add_argument('--port', type=int, default=8000, help="监听端口")
+    parser.add_argument('--delay', type=float, default=0, help="每个请求的模拟延迟(毫秒)")
+    args = parser.parse_args(argv)
+
+    server = serve(args.root, args.host, args.port, args.release, args.delay / 1000)
+    print("本地替身服务器已启动: http://{0}:{1}\n将配置项 mirror_url 或环境变量 FD_MIRROR_URL 设置为该地址".format(
+        args.host, server.server_address[1]), file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
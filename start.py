@@ -1,7 +1,11 @@
 from PySide2.QtWidgets import QApplication
 
 import global_var
+import FDCache
+import FDSearch
+import FDDuplicate
 import FDDebug
+import FDRescue
 import FDUpdate
 import FDCustom
 import FDUtility
@@ -11,9 +15,15 @@ import FDMain
 # 新建 Pyside2 Application
 app = QApplication([])
 
+# 检查所有窗口的依赖文件，缺少时一次恢复
+FDRescue.checkFiles()
+
 # 初始化模块
 FDDebug.init()
 global_var.init()
+FDCache.init()
+FDSearch.init()
+FDDuplicate.init()
 FDUpdate.init()
 FDCustom.init()
 FDUtility.init()
@@ -21,9 +31,8 @@ FDUtility.init()
 # 初始化主窗口
 FDMain.init()
 
-# 显示主窗口并导入模板&检查更新
+# 显示主窗口并导入模板，模板载入完成后在后台检查更新
 FDMain.display()
-FDUtility.checkUpdate()
 FDMain.loadTemplates()
 
 # 开始事件循环
@@ -0,0 +1,197 @@
+import argparse
+import os
+import sys
+
+import requests
+
+import FDCatalog
+import FDDownload
+import FDStore
+import FDSync
+import FDTemplate
+import global_var
+
+# 命令行同步模板，不需要创建 QApplication，同名模板按同步策略处理，无需人工确认
+# 用法: python sync.py [--policy overwrite|rename|skip|newest] [--delta] [--mirror 镜像目录] [--dry-run]
+
+# 命令行同步读取的配置项
+config_keys = ['http_cache_ttl', 'offline_mode', 'delta_sync', 'sync_mirror_dir', 'sync_policy',
+               'mirror_url', 'endpoints']
+
+
+def applyConfig(data: dict) -> None:
+    # 与主界面相同，只应用已启用且版本相符的配置文件
+    if not data.get('config') is True:
+        return
+    if not data.get('version') in [global_var.current_version, '*', 'all']:
+        return
+    for key in config_keys:
+        if key in data.keys():
+            global_var.set_config(key, data.get(key))
+
+
+def localIndex(store: FDStore.Store = None) -> (dict, dict):
+    # 本地模板索引，返回 ({hash: 模板名称}, {模板名称: 修改时间})，同时应用配置文件
+    hashes = {}
+    times = {}
+
+    if store is not None:
+        for data in store.configs():
+            applyConfig(data)
+        for sha, name, modified in store.index():
+            hashes[sha] = name
+            times[name] = modified
+        return hashes, times
+
+    if not os.path.exists(FDTemplate.template_dir):
+        return hashes, times
+    catalog = FDCatalog.Catalog(lazy=True)
+    for path, dir_list, file_list in os.walk(FDTemplate.template_dir):
+        for file_name in file_list:
+            if not file_name.endswith(".json"):
+                continue
+            entry = catalog.loadFile(os.path.join(path, file_name))
+            if entry.get('data') is None:
+                continue
+            if FDTemplate.isConfig(entry['data']):
+                applyConfig(entry['data'])
+                continue
+            hashes[entry['hash']] = entry['data'].get('name')
+            times[entry['data'].get('name')] = entry['mtime'] / 1e9
+    catalog.save()
+    return hashes, times
+
+
+def downloadTemplates(downloads: list, delta_sync: bool, mirror_dir: str, jobs: int) -> (list, list):
+    # 下载 [(保存名称, 云端模板信息)]，返回 ([(保存名称, 文件内容)], [(保存名称, 错误)])
+    if delta_sync:
+        wanted = dict((template['path'], template['sha']) for name, template in downloads)
+        files, fetch_errors = FDSync.fetchFiles(wanted, mirror_dir)
+        fetch_errors = dict(fetch_errors)
+        items = []
+        errors = []
+        for name, template in downloads:
+            if template['path'] in files:
+                items.append((name, files[template['path']]))
+            else:
+                errors.append((name, fetch_errors.get(template['path'])))
+        return items, errors
+
+    items = []
+    errors = []
+    for name, content, error in FDDownload.downloadAll([(name, template['download_url'])
+                                                        for name, template in downloads], workers=jobs):
+        if error is None:
+            items.append((name, content))
+        else:
+            errors.append((name, error))
+    return items, errors
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="别在这立法典 DontFDHere 命令行同步模板")
+    parser.add_argument('--policy', choices=[policy for policy in FDSync.sync_policies if not policy == 'ask'],
+                        help="同名但内容不同的模板的处理方式: overwrite 覆盖下载, rename 重命名下载, skip 不下载, "
+                             "newest 云端较新时覆盖下载，默认使用配置项 sync_policy，未配置时不下载")
+    parser.add_argument('--delta', action='store_true', help="增量同步: 从一个压缩包中取出改动的模板")
+    parser.add_argument('--mirror', help="增量同步时从本地镜像目录读取模板文件")
+    parser.add_argument('--offline', action='store_true', help="离线模式: 只使用缓存的模板列表")
+    parser.add_argument('--dry-run', action='store_true', help="只显示将要下载的模板，不下载")
+    parser.add_argument('-j', '--jobs', type=int, default=FDDownload.max_workers, help="同时下载的模板数量")
+    args = parser.parse_args(argv)
+
+    # 读取本地模板，使用模板数据库时所有模板在一个事务中写入
+    store = None
+    try:
+        if FDStore.isEnabled():
+            store = FDStore.Store()
+        elif not os.path.exists(FDTemplate.template_dir):
+            os.mkdir(FDTemplate.template_dir)
+        local_hashes, local_times = localIndex(store)
+    except (FDTemplate.TemplateError, OSError) as e:
+        print("读取本地模板失败: {0}".format(e), file=sys.stderr)
+        return 1
+
+    try:
+        # 命令行参数优先于配置项，配置为逐个询问时不下载同名模板
+        if args.offline:
+            global_var.set_config('offline_mode', True)
+        delta_sync = args.delta or global_var.get_config('delta_sync') is True or args.mirror is not None
+        mirror_dir = args.mirror or global_var.get_config('sync_mirror_dir')
+        policy = args.policy or global_var.get_config('sync_policy')
+        if policy not in FDSync.sync_policies or policy == 'ask':
+            policy = 'skip'
+
+        # 获取云端模板列表
+        try:
+            if delta_sync:
+                listing = FDSync.remoteTree()
+            else:
+                listing, stale = FDSync.remoteContents()
+                if stale:
+                    print("网络连接异常或处于离线模式，使用缓存的模板列表", file=sys.stderr)
+        except requests.exceptions.RequestException as e:
+            print("网络连接异常，同步模板失败: {0}".format(e), file=sys.stderr)
+            return 1
+        except (FDSync.SyncError, ValueError) as e:
+            print("同步模板失败: {0}".format(e), file=sys.stderr)
+            return 1
+
+        new_templates, changed_templates, existed_templates = FDSync.classify(listing,
+                                                                              local_hashes.keys(),
+                                                                              local_hashes.values())
+
+        # 按修改时间处理时获取每个同名模板最近一次被改动的提交时间
+        remote_times, time_error = FDSync.fileTimes(changed_templates) if policy == 'newest' else ({}, None)
+        # 无法获取云端修改时间的同名模板不下载，同步结束后以非零状态退出
+        missing = []
+
+        # 按同步策略处理同名模板，新模板全部下载
+        downloads = []
+        for template in changed_templates:
+            name = template['name'].replace('.json', '')
+            action = FDSync.resolve(policy, local_times.get(name), remote_times.get(template['path']))
+            if policy == 'newest' and template['path'] not in remote_times:
+                missing.append(name)
+                print("{0}: 无法获取云端修改时间，不下载".format(name), file=sys.stderr)
+                continue
+            print("{0}: {1}".format(name, {'overwrite': "覆盖下载", 'rename': "重命名下载", 'skip': "不下载"}[action]),
+                  file=sys.stderr)
+            if not action == 'skip':
+                downloads.append((FDSync.saveName(name, action), template))
+        for template in new_templates:
+            name = template['name'].replace('.json', '')
+            print("{0}: 新模板".format(name), file=sys.stderr)
+            downloads.append((name, template))
+
+        print("在云端共发现了{0}个模板，{1}个已是最新，{2}个有变动，{3}个在本地不存在".format(
+            len(listing), len(existed_templates), len(changed_templates), len(new_templates)), file=sys.stderr)
+        if len(missing) > 0:
+            print("{0}个同名模板无法获取云端修改时间，未下载{1}".format(
+                len(missing), ": {0}".format(time_error) if time_error else ""), file=sys.stderr)
+        if args.dry_run or len(downloads) == 0:
+            return 1 if len(missing) > 0 else 0
+
+        # 下载所有模板后在一次写入中保存
+        try:
+            items, errors = downloadTemplates(downloads, delta_sync, mirror_dir, max(args.jobs, 1))
+        except (requests.exceptions.RequestException, FDSync.SyncError, OSError) as e:
+            print("下载模板失败: {0}".format(e), file=sys.stderr)
+            return 1
+        cnt, save_errors = FDSync.saveTemplates(items, store)
+        errors += save_errors
+    finally:
+        if store is not None:
+            store.close()
+
+    if delta_sync and len(errors) == 0:
+        FDSync.removeArchive()
+
+    for name, error in errors:
+        print("模板下载失败: {0}, {1}".format(name, error), file=sys.stderr)
+    print("本次同步共下载了{0}个模板".format(cnt), file=sys.stderr)
+    return 1 if len(errors) > 0 or len(missing) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+
+import FDStore
+import FDTemplate
+
+
+class ExportTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        # 模板文件导入模板数据库后再导出，导出的文件hash与原文件相同
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = FDStore.Store(os.path.join(temp_dir, "FDTemplates.db"))
+            try:
+                cnt, errors = store.importDirectory(FDTemplate.template_dir)
+                self.assertEqual(errors, [])
+                export_dir = os.path.join(temp_dir, "export")
+                self.assertEqual(store.exportDirectory(export_dir), cnt)
+            finally:
+                store.close()
+
+            exported = {}
+            for file_name in os.listdir(export_dir):
+                hash_value, data = FDTemplate.readTemplate(os.path.join(export_dir, file_name))
+                if not FDTemplate.isConfig(data):
+                    exported[data.get('name')] = hash_value
+
+            for path, dir_list, file_list in os.walk(FDTemplate.template_dir):
+                for file_name in file_list:
+                    if not file_name.endswith(".json"):
+                        continue
+                    hash_value, data = FDTemplate.readTemplate(os.path.join(path, file_name))
+                    if not FDTemplate.isConfig(data):
+                        self.assertEqual(exported.get(data.get('name')), hash_value, file_name)
+
+
+if __name__ == '__main__':
+    unittest.main()